@@ -0,0 +1,254 @@
+"""
+Benchmarks for the disp formatters, run with `asv <https://asv.readthedocs.io>`_.
+
+``time_*`` benchmarks report wall time, ``peakmem_*`` the peak memory of the
+process and ``track_*_bytes`` the size of the html produced. Formatters are
+exercised in a headless :class:`InteractiveShell`.
+"""
+
+import io
+import json
+import time
+import tracemalloc
+
+from IPython.core.interactiveshell import InteractiveShell
+
+
+def shell():
+    ip = InteractiveShell.instance()
+    ip.display_formatter.active_types = list(ip.display_formatter.formatters)
+    return ip
+
+
+def py3only():
+    """
+    Import py3only and activate the container formatters.
+    """
+    shell()
+    import disp
+    from disp import py3only
+    disp.activate_containers()
+    return py3only
+
+
+class Response:
+    """
+    Stand-in for `requests.models.Response`.
+    """
+
+    def __init__(self, payload):
+        self.status_code = 200
+        self.url = 'https://example.org/api'
+        self.headers = {'Content-Type': 'application/json', 'Server': 'bench'}
+        self.encoding = 'utf-8'
+        self._content = json.dumps(payload).encode()
+        self._content_consumed = True
+
+    def __repr__(self):
+        return '<Response [200]>'
+
+    def json(self):
+        return json.loads(self._content)
+
+
+def traced_peak(func, *args):
+    """
+    Peak of the memory allocated while running ``func(*args)``, in bytes.
+    """
+    tracemalloc.start()
+    try:
+        func(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def deep_class(depth):
+    cls = object
+    for i in range(depth):
+        cls = type('Level{}'.format(i), (cls,), {'__doc__': 'Level {} of a deep hierarchy.'.format(i)})
+    return cls
+
+
+def nested_payload(width, depth):
+    if depth == 0:
+        return list(range(width))
+    return {'key{}'.format(i): nested_payload(width, depth - 1) for i in range(width)}
+
+
+class FlatContainer:
+    params = [10, 1000, 100000]
+    param_names = ['length']
+
+    def setup(self, length):
+        self.py3only = py3only()
+        self.ints = list(range(length))
+        self.mixed = [(i, str(i), [i]) for i in range(length)]
+
+    def time_list_of_ints(self, length):
+        self.py3only.html_formatter_for_list(self.ints)
+
+    def time_list_of_tuples(self, length):
+        self.py3only.html_formatter_for_list(self.mixed)
+
+    def peakmem_list_of_tuples(self, length):
+        self.py3only.html_formatter_for_list(self.mixed)
+
+    def track_list_of_tuples_bytes(self, length):
+        return len(self.py3only.html_formatter_for_list(self.mixed))
+    track_list_of_tuples_bytes.unit = 'bytes'
+
+    def track_list_of_tuples_traced_peak(self, length):
+        return traced_peak(self.py3only.html_formatter_for_list, self.mixed)
+    track_list_of_tuples_traced_peak.unit = 'bytes'
+
+
+class Leaves:
+    """
+    Per-leaf cost of rendering a list of ints, with the whole list displayed.
+    """
+
+    def setup(self):
+        self.py3only = py3only()
+        self.ints = list(range(100000))
+        self.head = self.py3only.max_head_items
+        self.py3only.max_head_items = len(self.ints)
+
+    def teardown(self):
+        self.py3only.max_head_items = self.head
+
+    def time_100k_ints(self):
+        self.py3only.html_formatter_for_list(self.ints)
+
+
+class Mapping:
+    params = [(10, 2), (10, 4), (100, 2)]
+    param_names = ['width, depth']
+
+    def setup(self, shape):
+        self.py3only = py3only()
+        self.mapping = nested_payload(*shape)
+
+    def time_mapping(self, shape):
+        self.py3only.html_formatter_for_mapping(self.mapping)
+
+    def peakmem_mapping(self, shape):
+        self.py3only.html_formatter_for_mapping(self.mapping)
+
+    def track_mapping_bytes(self, shape):
+        return len(self.py3only.html_formatter_for_mapping(self.mapping))
+    track_mapping_bytes.unit = 'bytes'
+
+    def time_mapping_to_sink(self, shape):
+        self.py3only.write_html(io.StringIO(), self.py3only.html_formatter_for_mapping, self.mapping)
+
+    def track_mapping_traced_peak(self, shape):
+        return traced_peak(self.py3only.html_formatter_for_mapping, self.mapping)
+    track_mapping_traced_peak.unit = 'bytes'
+
+    def track_mapping_to_sink_traced_peak(self, shape):
+        return traced_peak(self.py3only.write_html, io.StringIO(),
+                           self.py3only.html_formatter_for_mapping, self.mapping)
+    track_mapping_to_sink_traced_peak.unit = 'bytes'
+
+    def track_mapping_compact_ratio(self, shape):
+        """Size of the compact output, relative to the pretty one."""
+        from disp import template
+        render = self.py3only.html_formatter_for_mapping
+        try:
+            template.compact = False
+            pretty = len(render(self.mapping))
+        finally:
+            template.compact = True
+        return len(render(self.mapping)) / pretty
+    track_mapping_compact_ratio.unit = 'ratio'
+
+
+class ResponseFormatter:
+
+    def setup(self):
+        self.py3only = py3only()
+        self.response = Response(nested_payload(10, 3))
+
+    def time_response(self):
+        self.py3only.html_formatter_for_Response(self.response)
+
+    def peakmem_response(self):
+        self.py3only.html_formatter_for_Response(self.response)
+
+    def track_response_bytes(self):
+        return len(self.py3only.html_formatter_for_Response(self.response))
+    track_response_bytes.unit = 'bytes'
+
+
+class TypeFormatter:
+    params = [1, 10, 100, 500]
+    param_names = ['depth']
+
+    def setup(self, depth):
+        self.py3only = py3only()
+        self.cls = deep_class(depth)
+
+    def time_type_cold(self, depth):
+        self.py3only.render_cache.clear()
+        self.py3only.html_formatter_for_type(self.cls)
+
+    def time_type_warm(self, depth):
+        self.py3only.html_formatter_for_type(self.cls)
+
+    def track_type_bytes(self, depth):
+        return len(self.py3only.html_formatter_for_type(self.cls))
+    track_type_bytes.unit = 'bytes'
+
+
+class SlowRepr:
+    """
+    Stand-in for an object whose representation waits on I/O.
+    """
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def _repr_html_(self):
+        time.sleep(self.latency)
+        return '<i>remote</i>'
+
+
+class ParallelChildren:
+    """
+    Latency of a list of 16 objects taking 10ms each to represent, depending
+    on the number of threads rendering them.
+    """
+    params = [0, 1, 2, 4, 8, 16]
+    param_names = ['parallel_workers']
+
+    def setup(self, workers):
+        self.py3only = py3only()
+        self.py3only.parallel_workers = workers
+        self.items = [SlowRepr(0.01) for _ in range(16)]
+        # Start the pool outside of the measure.
+        self.py3only.html_formatter_for_list(self.items[:2])
+
+    def teardown(self, workers):
+        self.py3only.parallel_workers = 0
+
+    def time_list_of_slow_reprs(self, workers):
+        self.py3only.html_formatter_for_list(self.items)
+
+
+class Startup:
+
+    def setup(self):
+        self.shell = shell()
+
+    def time_activate_builtins(self):
+        import disp
+        disp.activate_builtins()
+
+    def time_load_extension(self):
+        import disp
+        disp.load_ipython_extension(self.shell)
+
+
+def timeraw_import_disp():
+    return "import disp"
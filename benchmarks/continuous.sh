@@ -0,0 +1,16 @@
+#!/bin/sh
+# Fail if a benchmark got more than 50% slower or bigger than on a reference
+# commit, built and run on the same machine.
+#
+# The reference is the commit pinned in benchmarks/reference if that file
+# exists – pin commits of the main branch only, as others can be rebased away –
+# else the parent of HEAD: for a pull request, CI builds the merge commit, whose
+# first parent is the tip of the target branch.
+set -e
+if [ -f benchmarks/reference ]; then
+    reference=$(cat benchmarks/reference)
+else
+    reference=HEAD^
+fi
+asv machine --yes
+asv continuous --factor 1.5 --split "$reference" HEAD
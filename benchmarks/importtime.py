@@ -0,0 +1,42 @@
+"""
+Check that ``import disp`` stays cheap: it must not import IPython, nor any of
+the formatter submodules, and must take less than ``--max-ms`` milliseconds
+(cumulated, as reported by ``python -X importtime``).
+
+    $ python benchmarks/importtime.py --max-ms 20
+"""
+
+import argparse
+import subprocess
+import sys
+
+FORBIDDEN = ('IPython', 'disp.py3only', 'disp.spark', 'disp.vendor')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--max-ms', type=float, default=20.0)
+    args = parser.parse_args()
+
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import disp'],
+                          stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    cumulative = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line[len('import time:'):].split('|'))
+        if cumulative_us.isdigit():
+            cumulative[name] = int(cumulative_us)
+
+    failures = [name for name in cumulative if name.split('.')[0] in FORBIDDEN or name in FORBIDDEN]
+    total_ms = cumulative.get('disp', 0) / 1000
+    print('import disp: {:.1f} ms'.format(total_ms))
+    if failures:
+        print('import disp should not import: ' + ', '.join(sorted(failures)))
+    if total_ms > args.max_ms:
+        print('import disp takes more than {} ms'.format(args.max_ms))
+    return 1 if failures or total_ms > args.max_ms else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
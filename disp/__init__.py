@@ -12,12 +12,18 @@ The following activate rich repr on a couple of builtins types:
     - functions/methods
     - types
     - modules
+    - asyncio tasks and futures, and concurrent.futures futures
 
 >>> import disp; disp.activate_builtins()
 
 As this may have side-effect the setting does not persist across sessions
 
 
+Containers (dict, list, tuple, set, frozenset and their subclasses) can be
+activated all at once with:
+
+>>> import disp; disp.activate_containers()
+
 Some object are not enabled by default, you can activate with:
 
 >>> import disp; disp.activate_for(something)
@@ -30,20 +36,32 @@ For example, a `requests`'s response.
 >>> response
 
 
+Statistics of the formatters registered by disp (calls, time, output size) are
+recorded after `%disp_stats on`, and shown by `%disp_stats` or `disp.stats()`.
+
+
 """
 
 import sys
-import json
 from os import path
 
-from IPython import get_ipython, paths
-from .spark import repr_spark_context_html, repr_spark_session_html
+from .instrument import register, stats
+
+__all__ = ['activate', 'activate_builtins', 'activate_containers', 'activate_for', 'install',
+           'load_ipython_extension', 'profile_dir', 'stats', 'uninstall']
 
 if sys.version_info < (3,):
     FileNotFoundError = IOError
-    JSONDecodeError = ValueError
-else:
-    from json.decoder import JSONDecodeError
+
+
+# Importing disp, and loading it as an extension, should be close to free as it
+# happens at every kernel start: IPython is only imported when needed, and
+# formatters are registered by reference, to be imported when an object they
+# apply to is first displayed.
+
+def get_ipython():
+    from IPython import get_ipython
+    return get_ipython()
 
 
 def load_ipython_extension(ipython):
@@ -51,51 +69,82 @@ def load_ipython_extension(ipython):
     Load an extension with IPython that tells it how to represent specifc
     objects.
     """
+    from .registry import LazyFormatter
     html = ipython.display_formatter.formatters['text/html']
 
-    html.for_type_by_name('pyspark.context','SparkContext', repr_spark_context_html)
-    html.for_type_by_name('pyspark.sql', 'SparkSession', repr_spark_session_html)
+    register(html, ('pyspark.context', 'SparkContext'), LazyFormatter('disp.spark:repr_spark_context_html'))
+    register(html, ('pyspark.sql', 'SparkSession'), LazyFormatter('disp.spark:repr_spark_session_html'))
+    register(html, ('pyspark.sql.dataframe', 'DataFrame'), LazyFormatter('disp.spark:repr_spark_dataframe_html'))
+
+    if sys.version_info >= (3, 7):
+        from .lazy import register_comm_target
+        from .instrument import disp_stats
+        register_comm_target(ipython)
+        ipython.register_magic_function(disp_stats, 'line', 'disp_stats')
+
+
+def activate(group):
+    """
+    Install the html_repr of all the formatters of a group of the registry:
+    ``'builtins'`` or ``'containers'``.
+    """
+    if sys.version_info < (3, 7):
+        raise RuntimeError('Sorry need python 3.7 or greater')
+    from .registry import pinning, registry
+    ipython = get_ipython()
+    html = ipython.display_formatter.formatters['text/html']
+    for target, formatter in registry.group(group):
+        if isinstance(target, str):
+            target = tuple(target.rsplit('.', 1))
+        register(html, target, pinning(html, target, formatter))
 
 
 def activate_builtins():
     """
     Install html_repr for a couple of the builtin
     """
-    if sys.version_info > (3, 6):
-        ipython = get_ipython()
-        html = ipython.display_formatter.formatters['text/html']
-        import types
-        from .py3only import html_formatter_for_builtin_function_or_method, html_formatter_for_type, html_formatter_for_module
-        html.for_type(types.FunctionType, html_formatter_for_builtin_function_or_method)
-        html.for_type(types.BuiltinFunctionType, html_formatter_for_builtin_function_or_method)
-        html.for_type(types.BuiltinMethodType, html_formatter_for_builtin_function_or_method)
-        html.for_type(types.MethodType, html_formatter_for_builtin_function_or_method)
-        html.for_type(types.ModuleType, html_formatter_for_module)
+    if sys.version_info >= (3, 7):
+        activate('builtins')
 
-        html.for_type(type, html_formatter_for_type)
+
+def activate_containers():
+    """
+    Install html_repr for dict, list, tuple, set and frozenset, and their
+    subclasses.
+    """
+    activate('containers')
 
 
 def activate_for(obj):
+    """
+    Install html_repr for the type of ``obj`` (or ``obj`` itself if it is a
+    type), with the formatter registered for the closest type in its MRO.
+    """
     ip = get_ipython()
     html = ip.display_formatter.formatters['text/html']
 
-    if sys.version_info < (3,6):
-        raise RuntimeError('Sorry need python 3.6 or greater')
+    if sys.version_info < (3, 7):
+        raise RuntimeError('Sorry need python 3.7 or greater')
     else:
-        from . import py3only
-    if type(obj) is type:
+        from .registry import registry
+    if isinstance(obj, type):
         target = obj
     else:
         target = type(obj)
 
-    attr = getattr(py3only, 'html_formatter_for_'+target.__name__.replace('.', '_'))
-    html.for_type(target, attr)
+    attr = registry.resolve(target)
+    if attr is None:
+        from . import py3only
+        attr = getattr(py3only, 'html_formatter_for_'+target.__name__.replace('.', '_'), None)
+    if attr is None:
+        raise TypeError('disp has no html formatter for {}'.format(target))
+    register(html, target, attr)
 
 def gen_help(obj):
     ip = get_ipython()
     from . import py3only
     html = ip.display_formatter.formatters['text/html']
-    html.for_type(type(obj), py3only.gen_help)
+    register(html, type(obj), py3only.gen_help)
 
 
     
@@ -104,20 +153,26 @@ config_value = "disp"
 shell_key = "extensions"
 app_key = "InteractiveShellApp"
 
-def get_config():
+def profile_dir():
+    """
+    Return the directory of the current IPython profile, or of the default one
+    outside of IPython.
+    """
     ip = get_ipython()
-
     if ip is None:
-        profile_dir = paths.locate_profile()
-    else:
-        profile_dir = ip.profile_dir.location
+        from IPython import paths
+        return paths.locate_profile()
+    return ip.profile_dir.location
+
 
-    json_path = path.join(profile_dir, "ipython_config.json")
+def get_config():
+    import json
+    json_path = path.join(profile_dir(), "ipython_config.json")
 
     try:
         with open(json_path, 'r') as f:
             config = json.load(f)
-    except (FileNotFoundError, JSONDecodeError):
+    except (FileNotFoundError, ValueError):  # ValueError: JSONDecodeError
         config = {}
     return config, json_path
 
@@ -134,6 +189,7 @@ def install():
     default IPython behavior.
     """
 
+    import json
     cfg, json_path = get_config()
 
     installed = config_value in cfg.get(app_key, {}).get(shell_key, [])
@@ -151,6 +207,7 @@ def install():
     print("💖 Installation succeeded: enjoy disp ! 💖")
 
 def uninstall():
+    import json
     cfg, json_path = get_config()
     if config_value not in cfg.get(app_key, {}).get(shell_key, []):
         print('😕 Disp is not installed. Aborting. 😕')
@@ -0,0 +1,114 @@
+"""
+Command line interface of disp.
+
+    python -m disp render [-o OUTPUT] [-j JOBS] [-c CHUNK_SIZE] FILE...
+
+renders the objects pickled in each FILE – several can be pickled one after the
+other in the same file – to ``OUTPUT/<FILE name>.html``. Files are split in
+chunks of objects, rendered in parallel by a pool of processes each running its
+own headless shell, and written in order as they complete.
+
+Finding where the objects of a file start takes a first, serial pass over it by
+a single worker, unpickling them (see :func:`disp.headless.pickle_offsets`);
+the files are scanned concurrently.
+"""
+
+import argparse
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+
+def _destination(source, output):
+    name = os.path.splitext(os.path.basename(source))[0]
+    return os.path.join(output, name + '.html')
+
+
+def _chunks(offsets, size):
+    """
+    Yield the ``(start, stop)`` offsets of chunks of ``size`` objects.
+    """
+    last = len(offsets) - 1
+    for i in range(0, last, size):
+        yield offsets[i], offsets[min(i + size, last)]
+
+
+def render(args):
+    from . import headless
+    os.makedirs(args.output, exist_ok=True)
+    jobs = args.jobs or os.cpu_count() or 1
+    start = time.perf_counter()
+    rendered = failed = 0
+    errors = set()
+    # source -> [output file, number of chunks not written yet]
+    outputs = {}
+    # (source, future) of the chunks in flight, in the order they are written.
+    pending = deque()
+
+    def write_next():
+        nonlocal rendered, failed
+        source, future = pending.popleft()
+        output = outputs[source]
+        output[1] -= 1
+        if source not in errors:
+            try:
+                html, n, f = future.result()
+            except Exception as e:
+                print(f'{source}: {type(e).__name__}: {e}', file=sys.stderr)
+                errors.add(source)
+            else:
+                output[0].write(html)
+                rendered += n
+                failed += f
+        if not output[1]:
+            output[0].close()
+
+    with ProcessPoolExecutor(max_workers=jobs, initializer=headless.shell) as pool:
+        scans = [(source, pool.submit(headless.pickle_offsets, source)) for source in args.files]
+        for source, scan in scans:
+            try:
+                chunks = list(_chunks(scan.result(), args.chunk_size))
+            except Exception as e:
+                print(f'{source}: {type(e).__name__}: {e}', file=sys.stderr)
+                errors.add(source)
+                continue
+            out = open(_destination(source, args.output), 'w', encoding='utf-8')
+            if not chunks:
+                out.close()
+                continue
+            out.write(headless.stylesheets_html())
+            outputs[source] = [out, len(chunks)]
+            for chunk in chunks:
+                pending.append((source, pool.submit(headless.render_chunk, source, *chunk)))
+                # Bound the memory used by the chunks rendered ahead.
+                if len(pending) >= 2 * jobs:
+                    write_next()
+        while pending:
+            write_next()
+    elapsed = time.perf_counter() - start
+    print(f'Rendered {rendered} objects from {len(args.files) - len(errors)} files in {elapsed:.2f}s '
+          f'({rendered / elapsed:.0f} objects/s), {failed} failed to render.', file=sys.stderr)
+    return 1 if errors or failed else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m disp')
+    commands = parser.add_subparsers(dest='command')
+    render_parser = commands.add_parser('render', help='render pickled objects to html files')
+    render_parser.add_argument('files', nargs='+', metavar='FILE', help='pickle files to render')
+    render_parser.add_argument('-o', '--output', default='.', help='directory of the html files (default: .)')
+    render_parser.add_argument('-j', '--jobs', type=int, default=None,
+                               help='number of worker processes (default: number of CPUs)')
+    render_parser.add_argument('-c', '--chunk-size', type=int, default=100,
+                               help='number of objects rendered at once by a worker (default: 100)')
+    args = parser.parse_args(argv)
+    if args.command != 'render':
+        parser.print_help()
+        return 2
+    return render(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
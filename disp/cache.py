@@ -0,0 +1,117 @@
+"""
+Memoization of the html rendered for objects that are expensive to inspect,
+and which almost never change during a session: functions, types and modules.
+
+Entries are keyed by identity and dropped when the object is garbage collected
+(if it supports weak references), evicted in least-recently-used order past
+``maxsize``, and invalidated when the source file of the module defining the
+object changes – which is what ``%autoreload`` reacts to.
+"""
+
+import os
+import sys
+import weakref
+from collections import OrderedDict
+from functools import wraps
+
+from . import lazy, template
+from .vendor import repr_getter
+
+
+def _source_file(obj):
+    if isinstance(obj, type(sys)):
+        module = obj
+    else:
+        module = sys.modules.get(getattr(obj, '__module__', None) or '')
+    return getattr(module, '__file__', None)
+
+
+def _stamp(obj):
+    """
+    Return a value that changes when the source of ``obj`` is modified.
+    """
+    filename = _source_file(obj)
+    if not filename:
+        return None
+    try:
+        return os.stat(filename).st_mtime
+    except OSError:
+        return None
+
+
+class RenderCache:
+    """
+    LRU cache of rendered html, see module docstring.
+
+    ``hits`` and ``misses`` count lookups since creation or the last ``clear()``.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.enabled = True
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def _forget(self, key):
+        self._entries.pop(key, None)
+
+    def get(self, obj, render, name=None):
+        """
+        Return the html for ``obj`` from the cache, or from ``render(obj)``.
+
+        The rendering is not stored if it depends on the current rendering
+        state: lazy sections handles, objects elided because of the budget, or
+        back-references to objects rendered earlier.
+        """
+        if not self.enabled or lazy.enabled:
+            return render(obj)
+        key = (id(obj), name, template.compact)
+        stamp = _stamp(obj)
+        entry = self._entries.get(key)
+        if entry is not None:
+            ref, entry_stamp, html = entry
+            if ref() is obj and entry_stamp == stamp:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return html
+            del self._entries[key]
+        self.misses += 1
+        budget = repr_getter.budget
+        before = (budget.elided, budget.shared)
+        html = render(obj)
+        if (budget.elided, budget.shared) != before:
+            return html
+        try:
+            ref = weakref.ref(obj, lambda _, key=key: self._forget(key))
+        except TypeError:
+            # Builtin functions do not support weakrefs, but are not going
+            # anywhere either; keep a strong reference so the id stays valid.
+            ref = lambda obj=obj: obj
+        self._entries[key] = (ref, stamp, html)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return html
+
+    def memoize(self, func):
+        """
+        Decorator caching the html returned by a single-argument formatter.
+        """
+        @wraps(func)
+        def wrapper(obj):
+            return self.get(obj, func, func.__name__)
+        return wrapper
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries), 'maxsize': self.maxsize}
+
+
+render_cache = RenderCache()
@@ -0,0 +1,174 @@
+"""
+Persistent cache of the html rendered for modules and functions, shared by all
+the kernels of an IPython profile.
+
+Introspecting the same stdlib and third-party objects is otherwise redone at
+every kernel start. The cache is stored in a sqlite database in the profile
+directory, and is off by default; enable it – e.g. in a startup file – with:
+
+>>> from disp.diskcache import disk_cache; disk_cache.enabled = True
+
+Entries are keyed by the qualified name of the object, and only stored for
+objects that qualified name resolves back to. They are invalidated when the
+mtime of the file defining the object changes, or for objects without a source
+file (builtins, extension modules…) the version of their package or of Python.
+Objects defined interactively – in ``__main__``, or in any module without a
+source file nor a version – are never stored, as nothing tells when they are
+redefined, and other kernels define their own under the same name. At most
+``maxsize`` entries are kept, evicted in least-recently-used order.
+
+The cache is best-effort: any error of the database just disables it for the
+rest of the session.
+"""
+
+import os
+import sqlite3
+import sys
+import threading
+import time
+from functools import wraps
+
+from . import lazy, profile_dir, template
+from .cache import _source_file
+from .vendor import repr_getter
+
+
+# Bump when the html produced by the cached formatters changes.
+_schema = 1
+
+
+def qualname(obj):
+    """
+    Return the qualified name of ``obj`` if it resolves back to ``obj``, else
+    ``None``.
+    """
+    if isinstance(obj, type(sys)):
+        name = obj.__name__
+        return name if sys.modules.get(name) is obj else None
+    module, name = getattr(obj, '__module__', None), getattr(obj, '__qualname__', None)
+    if not module or not name or '<' in name:
+        return None
+    found = sys.modules.get(module)
+    for attr in name.split('.'):
+        found = getattr(found, attr, None)
+    return f'{module}.{name}' if found is obj else None
+
+
+def _stamp(obj, name):
+    """
+    Return a value that changes when ``obj`` may have changed, or ``None`` if
+    there is no way to tell.
+    """
+    root = name.split('.')[0]
+    if root == '__main__':
+        return None
+    filename = _source_file(obj)
+    if filename:
+        try:
+            return f'mtime:{os.stat(filename).st_mtime}'
+        except OSError:
+            return None
+    version = getattr(sys.modules.get(root), '__version__', None)
+    if isinstance(version, str):
+        return f'version:{version}'
+    if root in sys.builtin_module_names:
+        return f'python:{sys.version}'
+    return None
+
+
+class DiskCache:
+    """
+    sqlite-backed LRU cache of rendered html, see module docstring.
+    """
+
+    def __init__(self, filename=None, maxsize=10000):
+        self.filename = filename
+        self.maxsize = maxsize
+        self.enabled = False
+        self.hits = 0
+        self.misses = 0
+        self._db = None
+        self._lock = threading.Lock()
+        self._environment = None
+
+    def _connect(self):
+        if self._db is None:
+            if self.filename is None:
+                self.filename = os.path.join(profile_dir(), 'disp', 'render_cache.sqlite')
+            os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+            db = sqlite3.connect(self.filename, timeout=0.1, check_same_thread=False,
+                                 isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=OFF')
+            db.execute('CREATE TABLE IF NOT EXISTS renders ('
+                       'key TEXT PRIMARY KEY, stamp TEXT, html TEXT, used REAL)')
+            db.execute('CREATE INDEX IF NOT EXISTS renders_used ON renders (used)')
+            import IPython
+            self._environment = f'{_schema}|{IPython.__version__}|{sys.version}'
+            self._db = db
+        return self._db
+
+    def _execute(self, query, *args):
+        with self._lock:
+            try:
+                return self._connect().execute(query, args).fetchall()
+            except (sqlite3.Error, OSError):
+                self.enabled = False
+                return []
+
+    def __len__(self):
+        return self._execute('SELECT COUNT(*) FROM renders')[0][0] if self.enabled else 0
+
+    def clear(self):
+        self._execute('DELETE FROM renders')
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, obj, render, name=None):
+        """
+        Return the html for ``obj`` from the cache, or from ``render(obj)``.
+
+        Like :class:`disp.cache.RenderCache`, renderings depending on the
+        current rendering state are not stored.
+        """
+        if not self.enabled or lazy.enabled:
+            return render(obj)
+        qualified = qualname(obj)
+        if qualified is None:
+            return render(obj)
+        stamp = _stamp(obj, qualified)
+        if stamp is None:
+            return render(obj)
+        key = f'{qualified}|{name}|{template.compact}'
+        rows = self._execute('SELECT stamp, html FROM renders WHERE key = ?', key)
+        # Read after the lookup, which connects to the database.
+        stamp = f'{stamp}|{self._environment}'
+        if rows and rows[0][0] == stamp:
+            self.hits += 1
+            self._execute('UPDATE renders SET used = ? WHERE key = ?', time.time(), key)
+            return rows[0][1]
+        self.misses += 1
+        budget = repr_getter.budget
+        before = (budget.elided, budget.shared)
+        html = render(obj)
+        if (budget.elided, budget.shared) != before or not self.enabled:
+            return html
+        self._execute('INSERT OR REPLACE INTO renders VALUES (?, ?, ?, ?)', key, stamp, html, time.time())
+        self._execute('DELETE FROM renders WHERE key IN '
+                      '(SELECT key FROM renders ORDER BY used DESC LIMIT -1 OFFSET ?)', self.maxsize)
+        return html
+
+    def memoize(self, func):
+        """
+        Decorator caching the html returned by a single-argument formatter.
+        """
+        @wraps(func)
+        def wrapper(obj):
+            return self.get(obj, func, func.__name__)
+        return wrapper
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self), 'maxsize': self.maxsize}
+
+
+disk_cache = DiskCache()
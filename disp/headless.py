@@ -0,0 +1,157 @@
+"""
+Rendering outside of a live IPython session, e.g. to build html reports.
+
+>>> from disp import headless
+>>> headless.render_html({'a': [1, 2, 3]})
+
+The formatters still go through an :class:`InteractiveShell`: if none is
+running, a headless one is created on first use, with all the disp formatters
+activated. See ``python -m disp render --help`` to render pickled objects in
+batch. In the html files rendered, the stylesheets are written once at the top
+rather than in front of each object.
+"""
+
+import pickle
+from html import escape
+
+from . import activate
+from .vendor import get_repr_mimebundle, repr_getter
+
+_shell = None
+
+
+def shell():
+    """
+    Return the current shell, or a headless one with the disp formatters
+    activated and all mimetypes rendered.
+    """
+    global _shell
+    from IPython.core.interactiveshell import InteractiveShell
+    if InteractiveShell.initialized():
+        return InteractiveShell.instance()
+    if _shell is None:
+        _shell = InteractiveShell.instance()
+        _shell.display_formatter.active_types = list(_shell.display_formatter.formatters)
+        for group in ('builtins', 'containers'):
+            activate(group)
+    return _shell
+
+
+def render(obj, include=('text/html', 'text/plain'), *, styled=True):
+    """
+    Return the mimebundle of ``obj``, restricted to ``include``.
+
+    As for a display, the html is a top-level rendering: it is prefixed with
+    the disp stylesheets – unless ``styled`` is false – and followed by how many
+    nested objects were elided.
+    """
+    shell()
+    from .py3only import elided_note, stylesheets
+    # get_repr_mimebundle starts the rendering before the disp formatters run,
+    # so they do not see it as top-level: do their part here.
+    with repr_getter.render():
+        data = dict(get_repr_mimebundle(obj, include=include).data)
+        if 'text/html' in data:
+            data['text/html'] = (stylesheets.emit() if styled else '') + data['text/html'] + elided_note()
+    return data
+
+
+def render_html(obj, *, styled=True):
+    """
+    Return the html of ``obj``, falling back to its escaped plain text repr.
+    """
+    data = render(obj, styled=styled)
+    if 'text/html' in data:
+        return data['text/html']
+    return f"<pre>{escape(data.get('text/plain', ''))}</pre>"
+
+
+def stylesheets_html():
+    """
+    Return the stylesheets to write once at the top of an html report.
+    """
+    from .py3only import stylesheets
+    return stylesheets.html()
+
+
+def _render_object(obj):
+    """
+    Return the html of ``obj`` for a report – without stylesheets – and whether
+    it rendered.
+    """
+    try:
+        html, ok = render_html(obj, styled=False), True
+    except Exception as e:
+        html, ok = f"<pre class='disp-error'>{escape(type(e).__name__)}: {escape(str(e))}</pre>", False
+    return f"<div class='disp-output'>{html}</div>\n", ok
+
+
+def load_pickles(filename):
+    """
+    Yield the objects pickled in ``filename``, one after the other, until the
+    end of the file.
+    """
+    with open(filename, 'rb') as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
+
+
+def pickle_offsets(filename):
+    """
+    Return the offsets at which the objects pickled in ``filename`` start,
+    followed by the offset of the end of the last one.
+
+    Pickles cannot be skipped without parsing them: the objects are unpickled,
+    which the C unpickler does faster than :func:`pickletools.genops` walks
+    their opcodes. This pass is serial, and each object is unpickled again
+    when rendered.
+    """
+    offsets = [0]
+    with open(filename, 'rb') as f:
+        while True:
+            try:
+                pickle.load(f)
+            except EOFError:
+                return offsets
+            offsets.append(f.tell())
+
+
+def render_chunk(filename, start, stop):
+    """
+    Render the objects pickled in ``filename`` between the offsets ``start``
+    and ``stop`` (see :func:`pickle_offsets`).
+
+    Return their html, the number of objects rendered, and of objects that
+    failed to.
+    """
+    html = []
+    failed = 0
+    with open(filename, 'rb') as f:
+        f.seek(start)
+        while f.tell() < stop:
+            out, ok = _render_object(pickle.load(f))
+            html.append(out)
+            failed += not ok
+    return ''.join(html), len(html), failed
+
+
+def render_file(source, destination):
+    """
+    Render the objects pickled in ``source`` to the html file ``destination``,
+    writing each as soon as it is rendered.
+
+    Return the number of objects rendered, and of objects that failed to.
+    """
+    rendered = failed = 0
+    with open(destination, 'w', encoding='utf-8') as out:
+        for obj in load_pickles(source):
+            html, ok = _render_object(obj)
+            if not rendered:
+                out.write(stylesheets_html())
+            out.write(html)
+            rendered += 1
+            failed += not ok
+    return rendered, failed
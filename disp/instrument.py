@@ -0,0 +1,134 @@
+"""
+Opt-in instrumentation of the formatters registered by disp.
+
+Every formatter disp registers goes through :func:`register`. While
+instrumentation is disabled (the default) the formatters are registered as is,
+so it costs nothing; :func:`enable` re-registers them wrapped in a function
+recording, per formatter and per type of displayed object:
+
+    - the number of calls,
+    - the cumulative and maximum wall time,
+    - the number of characters produced,
+    - the maximum nesting depth they were called at.
+
+Read them with :func:`stats`, or the ``%disp_stats`` magic.
+"""
+
+from functools import wraps
+
+
+enabled = False
+
+# (formatter, target) -> raw formatter function.
+_registrations = {}
+
+# (formatter name, type name) -> [calls, total time, max time, chars, max depth]
+_stats = {}
+
+
+def _record(func, obj, elapsed, out, depth):
+    t = type(obj)
+    key = (func.__name__, '{}.{}'.format(t.__module__, getattr(t, '__qualname__', t.__name__)))
+    entry = _stats.get(key)
+    if entry is None:
+        entry = _stats[key] = [0, 0.0, 0.0, 0, 0]
+    entry[0] += 1
+    entry[1] += elapsed
+    entry[2] = max(entry[2], elapsed)
+    entry[3] += len(out) if isinstance(out, str) else 0
+    entry[4] = max(entry[4], depth)
+
+
+def instrumented(func):
+    """
+    Return ``func`` wrapped to record its statistics.
+    """
+    # Imported here, as disp is imported on Python 2 to install it.
+    from time import perf_counter
+    from .vendor import repr_getter
+
+    @wraps(func)
+    def wrapper(obj, *args, **kwargs):
+        depth = repr_getter.depth
+        start = perf_counter()
+        out = func(obj, *args, **kwargs)
+        _record(func, obj, perf_counter() - start, out, depth)
+        return out
+    return wrapper
+
+
+def _for_target(fmt, target, func):
+    if isinstance(target, type):
+        fmt.for_type(target, func)
+        return
+    module, name = target
+    # Once a deferred printer has been used, IPython moved it to the type
+    # printers, where for_type_by_name does not override it anymore.
+    for cls in list(fmt.type_printers):
+        if cls.__module__ == module and cls.__name__ == name:
+            fmt.for_type(cls, func)
+            return
+    fmt.for_type_by_name(module, name, func)
+
+
+def register(fmt, target, func):
+    """
+    Register ``func`` with the formatter ``fmt`` (e.g. the ``text/html`` one),
+    for ``target``: a type, or a ``(module, name)`` pair for types which are
+    not imported yet.
+    """
+    _registrations[(fmt, target)] = func
+    _for_target(fmt, target, instrumented(func) if enabled else func)
+
+
+def enable():
+    global enabled
+    enabled = True
+    for (fmt, target), func in _registrations.items():
+        _for_target(fmt, target, instrumented(func))
+
+
+def disable():
+    global enabled
+    enabled = False
+    for (fmt, target), func in _registrations.items():
+        _for_target(fmt, target, func)
+
+
+def reset():
+    _stats.clear()
+
+
+def stats():
+    """
+    Return the statistics recorded so far, as a dict of dicts keyed by
+    ``(formatter name, type name)``.
+    """
+    return {key: {'calls': calls, 'total': total, 'max': max_, 'chars': chars, 'max_depth': depth}
+            for key, (calls, total, max_, chars, depth) in _stats.items()}
+
+
+def disp_stats(line=''):
+    """
+    Show the statistics of the disp formatters, slowest first.
+
+    %disp_stats [on|off|reset]
+    """
+    arg = line.strip()
+    if arg == 'on':
+        enable()
+    elif arg == 'off':
+        disable()
+    elif arg == 'reset':
+        reset()
+    elif arg:
+        print(disp_stats.__doc__)
+    else:
+        if not _stats:
+            print('No statistics recorded.' + ('' if enabled else ' Enable them with `%disp_stats on`.'))
+            return
+        row = '{:<48} {:<40} {:>7} {:>9} {:>8} {:>10} {:>5}'
+        print(row.format('formatter', 'type', 'calls', 'total ms', 'max ms', 'chars', 'depth'))
+        for (name, type_name), s in sorted(stats().items(), key=lambda item: -item[1]['total']):
+            print(row.format(name, type_name, s['calls'], '{:.2f}'.format(s['total'] * 1e3),
+                             '{:.2f}'.format(s['max'] * 1e3), s['chars'], s['max_depth']))
@@ -0,0 +1,174 @@
+"""
+On-demand rendering of collapsed sections.
+
+When ``enabled`` is set, the formatters of :mod:`disp.py3only` do not render the
+content of sections that start collapsed. They ship the summary and a handle
+instead, and the frontend asks the kernel for the content – over a comm
+targeting ``disp.lazy`` – the first time the section is expanded.
+
+The comm target is registered by :func:`disp.load_ipython_extension` when
+running in a kernel. Only the classic Notebook lets outputs open comms: other
+frontends (JupyterLab, VS Code, nbviewer, exported files…) could never expand a
+lazy section. Rendering is therefore only lazy once a frontend proved it can
+open the comm – the first display with ``enabled`` set carries a probe doing
+so – and stays eager otherwise. :class:`LocalComm` is an in-process stand-in that can be
+used to exercise the round trip without a frontend.
+"""
+
+from collections import OrderedDict
+from html import escape
+from itertools import count
+
+from .vendor import repr_getter
+
+
+enabled = False
+
+# Maximum number of pending handles; the oldest ones are forgotten first and
+# will render as expired if expanded afterward.
+max_pending = 10000
+
+comm_target = 'disp.lazy'
+
+# Set when a frontend opened a ``disp.lazy`` comm.
+frontend_ready = False
+
+_registered = False
+_probe_sent = False
+_pending = OrderedDict()
+_counter = count()
+
+
+# Run by the frontend when a lazy section is toggled: open a comm with the
+# handle, and replace the placeholder with the html sent back.
+_ontoggle = (
+    "if(this.open&&this.dataset.dispHandle&&window.Jupyter){"
+    "var d=this,h=d.dataset.dispHandle;delete d.dataset.dispHandle;"
+    "var c=Jupyter.notebook.kernel.comm_manager.new_comm('" + comm_target + "',{handle:h});"
+    "c.on_msg(function(m){d.lastElementChild.outerHTML=m.content.data.html;c.close();});}"
+)
+
+# Opens (and closes) a comm without handle, where ``_ontoggle`` would work.
+_probe = (
+    "<script>if(window.Jupyter&&Jupyter.notebook&&Jupyter.notebook.kernel){"
+    "Jupyter.notebook.kernel.comm_manager.new_comm('" + comm_target + "',{}).close();}</script>"
+)
+
+
+def register(render) -> str:
+    """
+    Store a callable rendering the content of a section, return its handle.
+    """
+    handle = str(next(_counter))
+    _pending[handle] = render
+    while len(_pending) > max_pending:
+        _pending.popitem(last=False)
+    return handle
+
+
+def _join(html) -> str:
+    return html if isinstance(html, str) else ''.join(html)
+
+
+def expand(handle) -> str:
+    """
+    Render the content registered for ``handle``.
+
+    Content is rendered only once, as frontends keep it after the first
+    expansion.
+    """
+    render = _pending.pop(handle, None)
+    if render is None:
+        return "<span class='jupyter-elided'>expired, display the object again</span>"
+    with repr_getter.render():
+        return _join(render())
+
+
+def iter_details(summary: str, render, *, open=False, cls='jupyter-details'):
+    """
+    Yield the fragments of a ``<details>`` section with ``summary`` as summary
+    (html), and ``render()`` as content.
+
+    ``render`` may return a string or an iterable of html fragments. It is
+    called immediately if the section is open, lazy rendering is disabled or
+    no frontend can expand lazy sections, and only on expansion otherwise.
+    """
+    global _probe_sent
+    if open or not (enabled and frontend_ready):
+        if enabled and _registered and not _probe_sent:
+            _probe_sent = True
+            yield _probe
+        op = 'open' if open else ''
+        yield f"<details class='{cls}' {op}><summary>{summary}</summary>"
+        content = render()
+        if isinstance(content, str):
+            yield content
+        else:
+            yield from content
+        yield "</details>"
+        return
+    handle = register(render)
+    yield (f"<details class='{cls} jupyter-lazy' data-disp-handle='{handle}' ontoggle=\"{escape(_ontoggle)}\">"
+           f"<summary>{summary}</summary><span class='jupyter-lazy-placeholder'>…</span></details>")
+
+
+def lazy_details(summary: str, render, *, open=False, cls='jupyter-details') -> str:
+    """
+    Same as :func:`iter_details`, as a single string.
+    """
+    return ''.join(iter_details(summary, render, open=open, cls=cls))
+
+
+def _on_comm_open(comm, msg):
+    global frontend_ready
+    frontend_ready = True
+    handle = msg['content']['data'].get('handle')
+    if handle is not None:
+        comm.send({'html': expand(handle)})
+
+
+def register_comm_target(ipython):
+    """
+    Register the ``disp.lazy`` comm target with the kernel of ``ipython``.
+
+    Return whether it was registered, it is not outside of a kernel.
+    """
+    global _registered
+    kernel = getattr(ipython, 'kernel', None)
+    if kernel is None:
+        return False
+    kernel.comm_manager.register_target(comm_target, _on_comm_open)
+    _registered = True
+    return True
+
+
+class LocalComm:
+    """
+    In-process stand-in for a frontend comm.
+
+    >>> LocalComm.expand(handle)
+
+    performs the same round trip as a frontend expanding a lazy section.
+    """
+
+    def __init__(self):
+        self.messages = []
+
+    def send(self, data=None, metadata=None, buffers=None):
+        self.messages.append(data)
+
+    def close(self, data=None, metadata=None, buffers=None):
+        pass
+
+    @classmethod
+    def probe(cls):
+        """
+        Open a comm without handle, as the probe sent to the frontend does.
+        """
+        _on_comm_open(cls(), {'content': {'data': {}}})
+
+    @classmethod
+    def expand(cls, handle) -> str:
+        comm = cls()
+        _on_comm_open(comm, {'content': {'data': {'handle': handle}}})
+        return comm.messages[-1]['html']
@@ -1,19 +1,48 @@
 """
 This submodule contains formatting utilities and formatters which will work only
-on Python 3.6+. There is no inherent reasons why it would not work on earlier
-version of Python, it just makes use of features that are 3.6 only – Like
-f-strings – to make the code more readable. Feel free to send patches that makes
-it compatible with earlier versions of python
+on Python 3.7+. It makes use of features that are 3.6 only – Like f-strings – to
+make the code more readable, and of :mod:`contextvars` (3.7) to keep apart the
+state of concurrent renderings.
 """
 
 
+import builtins
+import json
+import re
+import weakref
+from functools import wraps
 from html import escape
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar, copy_context
+from itertools import chain, islice
+from time import monotonic
 from typing import List
+from IPython import get_ipython
 from IPython.display import HTML
-from .vendor import get_repr_mimebundle
+from IPython.lib.pretty import _type_pprinters
+from .cache import render_cache
+from .diskcache import disk_cache
+from . import lazy
+from .lazy import iter_details, lazy_details
+from .template import Template, minify_css
+from .vendor import get_repr_mimebundle, repr_getter
 
 
-text_formatter = get_ipython().display_formatter.formatters['text/plain']
+# The shell is looked up when formatting, so this module can be imported before
+# (or without) one; its formatters are cached as long as it is the current one.
+_formatters = (None, None, None)
+
+
+def formatters():
+    """
+    Return the ``text/plain`` and ``text/html`` formatters of the current shell.
+    """
+    global _formatters
+    ip = get_ipython()
+    if _formatters[0] is not ip:
+        fmts = ip.display_formatter.formatters
+        _formatters = (ip, fmts['text/plain'], fmts['text/html'])
+    return _formatters[1:]
 
 
 def repr(o):
@@ -25,10 +54,44 @@ def repr(o):
 
     If the real repr is needed, then one need to use builtins.repr
     """
-    return text_formatter(o)
-
-
-# This is the CSS we want to inject before each top-level object. We should
+    return formatters()[0](o)
+
+
+# Containers longer than ``max_head_items + max_tail_items`` are not rendered
+# in full: only the first ``max_head_items`` and the last ``max_tail_items``
+# elements are, and a "N more…" marker stands for everything in between.
+# Rendering cost and output size thus depend on those two values, not on the
+# length of the container.
+max_head_items = 50
+max_tail_items = 10
+
+# Children of containers whose representation does I/O (remote handles, lazy
+# datasets…) can be rendered concurrently by a pool of ``parallel_workers``
+# threads; 0 renders them one after the other. Containers rendered by one of
+# those threads render their own children sequentially, so that the pool never
+# waits on itself.
+parallel_workers = 0
+
+# Response bodies are never downloaded for display: only bytes already
+# buffered are shown, at most ``max_body_preview`` of them as text. JSON bodies
+# larger than ``max_json_body`` are not parsed as a whole, only their first
+# ``max_head_items`` top-level keys are listed, scanning at most
+# ``max_json_scan`` bytes.
+max_body_preview = 16 * 1024
+max_json_body = 1024 * 1024
+max_json_scan = 1024 * 1024
+
+# Binary buffers are displayed as a hex dump of their first ``dump_head_bytes``
+# and last ``dump_tail_bytes`` bytes, read through memoryview slices so that the
+# rest of the buffer is never copied. With lazy rendering enabled, the whole
+# buffer can also be browsed by pages of ``dump_page_bytes``.
+dump_head_bytes = 256
+dump_tail_bytes = 64
+dump_page_bytes = 4096
+
+
+# This is the CSS we want to inject before each top-level object (see
+# `Stylesheets` below). We should
 # (try-to) make it to work with most frontend, as not all frontends do support
 # CSS injection, let's try to not rely on too much customisation
 
@@ -126,13 +189,109 @@ details.jupyter-details[open] ~ .jupyter-breaking-placeholder {
 .output_subarea > ul.jupyter-flat-container-repr, .output_subarea > ul.jupyter-flat-container-repr > p {
     margin-left: 1em;
 }
+
+.jupyter-more-items, .jupyter-elided, .jupyter-elided-note {
+    font-style: italic;
+    color: gray;
+}
 """
 
 
+class Stylesheets:
+    """
+    Registry of the stylesheets needed by the formatters.
+
+    Stylesheets are emitted in front of top-level objects only, never by
+    nested formatters. With ``scope = 'display'`` (the default) each top-level
+    display carries them; with ``scope = 'session'`` they are emitted once, by
+    the first display, and rely on the frontend keeping them around.
+    """
+
+    def __init__(self):
+        self._sheets = {}
+        self._emitted = set()
+        self.scope = 'display'
+
+    def register(self, name, css):
+        self._sheets[name] = Template(css, minify=minify_css)
+        self._emitted.discard(name)
+
+    def reset(self):
+        """Emit all the stylesheets again with the next top-level display."""
+        self._emitted.clear()
+
+    def emit(self) -> str:
+        names = [n for n in self._sheets if n not in self._emitted]
+        if self.scope == 'session':
+            self._emitted.update(names)
+        return ''.join(f'<style>{self._sheets[n]}</style>' for n in names)
+
+    def html(self) -> str:
+        """All the stylesheets, whatever the scope, e.g. for a standalone file."""
+        return ''.join(f'<style>{sheet}</style>' for sheet in self._sheets.values())
+
+
+stylesheets = Stylesheets()
+stylesheets.register('disp', thecss)
+
+
 ##########################################################################
 #                    Utilities                                                  #
 ##########################################################################
 
+def formatter(func):
+    """
+    Decorator for html formatters.
+
+    Run the formatter inside a top-level rendering of ``repr_getter``, so that
+    all the nested representations share the same budget. Top-level objects are
+    prefixed with the registered stylesheets, and followed by how many nested
+    objects were elided.
+
+    The formatter may return a string or yield html fragments. Fragments are
+    joined once, when the decorated formatter returns; ``.fragments(obj)``
+    gives access to them directly, see :func:`write_html`.
+    """
+    def fragments(obj, *args, **kwargs):
+        with repr_getter.render() as top:
+            if top:
+                yield stylesheets.emit()
+            out = func(obj, *args, **kwargs)
+            if isinstance(out, str):
+                yield out
+            else:
+                yield from out
+            if top:
+                yield elided_note()
+
+    @wraps(func)
+    def wrapper(obj, *args, **kwargs):
+        return ''.join(fragments(obj, *args, **kwargs))
+    wrapper.fragments = fragments
+    return wrapper
+
+
+def elided_note():
+    """
+    Html noting how many nested objects of the current rendering were elided,
+    if any.
+    """
+    elided = repr_getter.budget.elided
+    if not elided:
+        return ''
+    return f"<p class='jupyter-elided-note'>{elided} nested objects not shown (render budget exhausted, or slow to render)</p>"
+
+
+def write_html(sink, fmt, obj, *args, **kwargs):
+    """
+    Write the html representation of ``obj`` by the formatter ``fmt`` into
+    ``sink`` (e.g. a file or ``io.StringIO``), without building it as a whole
+    in memory first.
+    """
+    for fragment in fmt.fragments(obj, *args, **kwargs):
+        sink.write(fragment)
+
+
 def safe(obj):
     """
     Given an object (str, or html), return an HTML version. 
@@ -146,14 +305,87 @@ def safe(obj):
         return HTML(htmlify_repr(obj))
 
 
+# Leaves of these exact types are escaped directly by `htmlify_repr`, without
+# going through the display formatter, unless their display is customised.
+_scalar_types = frozenset((int, float, str, bytes, bool, type(None)))
+
+
+def _fast_repr(obj):
+    """
+    Return the escaped repr of a builtin scalar, or None if ``obj`` is not one
+    or if a formatter was registered to change how it is displayed.
+    """
+    t = type(obj)
+    if t not in _scalar_types:
+        return None
+    text_formatter, html_formatter = formatters()
+    if t in html_formatter.type_printers:
+        return None
+    if t is float:
+        if text_formatter.float_format != '%r':
+            return None
+    elif text_formatter.type_printers.get(t) is not _type_pprinters.get(t):
+        return None
+    return escape(builtins.repr(obj))
+
+
 def htmlify_repr(obj)-> str:
     """
     Return a string which is safe to embed in html. 
 
     ie, if obj define rerp_html, return this, otherwise escape its text_repr
+
+    Only the html representation is computed, and builtin scalars take a fast
+    path. The text one also goes through ``get_repr_mimebundle``, so that a slow
+    ``__repr__`` counts against the render deadline.
+    """
+    fast = _fast_repr(obj)
+    if fast is not None:
+        return fast
+    return get_repr_mimebundle(obj, include=('text/html',)).data.get('text/html', None) or\
+        escape(get_repr_mimebundle(obj, include=('text/plain',)).data.get('text/plain', ''))
+
+
+_pool = (0, None)
+_parallel = ContextVar('disp_parallel', default=True)
+
+
+def _get_pool():
+    global _pool
+    size, pool = _pool
+    if size != parallel_workers:
+        if pool is not None:
+            pool.shutdown(wait=False)
+        pool = ThreadPoolExecutor(max_workers=parallel_workers, thread_name_prefix='disp-render')
+        _pool = (parallel_workers, pool)
+    return pool
+
+
+def _htmlify_in_worker(obj):
+    _parallel.set(False)
+    return htmlify_repr(obj)
+
+
+def htmlify_all(objs):
+    """
+    Return an iterator over the :func:`htmlify_repr` of ``objs``, in order.
+
+    With ``parallel_workers`` set, they are rendered concurrently, each in a
+    copy of the current context: they share the render budget of the current
+    rendering, but each have their own recursion state. Scalars are rendered
+    right away.
     """
-    return get_repr_mimebundle(obj).data.get('text/html', None) or\
-        escape(repr(obj))
+    if parallel_workers <= 0 or not _parallel.get() or len(objs) < 2:
+        return map(htmlify_repr, objs)
+    pool = _get_pool()
+    results = []
+    for obj in objs:
+        fast = _fast_repr(obj)
+        if fast is None:
+            results.append(pool.submit(copy_context().run, _htmlify_in_worker, obj))
+        else:
+            results.append(fast)
+    return (r if isinstance(r, str) else r.result() for r in results)
 
 
 def details(summary, details_):
@@ -176,34 +408,77 @@ def well(s):
     return HTML('<div class="jupyter-extra-info">' + s + '</div>')
 
 
+def more_items(n):
+    return f"<span class='jupyter-more-items'>… {n} more</span>"
+
+
+def window(iterable, head=None, tail=None):
+    """
+    Return ``(head_items, n_elided, tail_items)`` for a sized iterable.
+
+    Only the elements that are going to be displayed are touched: sequences are
+    sliced, other iterables are consumed lazily for the head and walked
+    backward with ``reversed`` for the tail when they support it. Iterables that
+    cannot be reversed (like sets) only get their head displayed.
+    """
+    if head is None:
+        head = max_head_items
+    if tail is None:
+        tail = max_tail_items
+    length = len(iterable)
+    if length <= head + tail:
+        return list(iterable), 0, []
+    if isinstance(iterable, (list, tuple)):
+        return iterable[:head], length - head - tail, iterable[length - tail:]
+    head_items = list(islice(iterable, head))
+    try:
+        tail_items = list(islice(reversed(iterable), tail))[::-1]
+    except TypeError:
+        tail_items = []
+    return head_items, length - len(head_items) - len(tail_items), tail_items
+
+
 ##########################################################################
 #                           Formatters                                          #
 ##########################################################################
 
 
-def html_flat_container(container: List, delims, empty) -> str:
+_flat_container_open = Template("""<ul class="jupyter-flat-container-repr">
+                    <details class='jupyter-details' open>
+                        <summary>{}</summary>
+                        """)
+
+_flat_container_close = Template("""
+                    </details>
+                    <span class='jupyter-breaking-placeholder'></span><p>{}</p>
+                </ul>
+
+            """)
+
+
+@formatter
+def html_flat_container(container: List, delims, empty):
     """Retrun an Html representation of a list with recursive HTML repr for all sub objects. 
 
     If an object does not define an html representation, fallback on plain-text.
 
     """
     if not container:
-        return empty
-    x = []
-    for index, elem in enumerate(container):
-        last = (index == len(container) - 1)
-        rpr = htmlify_repr(elem)
-        pc = '<span class="post-comma">,</span>' if not last else ''
-        x.append('<li>{}{}</li>'.format(rpr, pc))
-    return f"""<ul class="jupyter-flat-container-repr">
-                    <details class='jupyter-details' open>
-                        <summary>{delims[0]}</summary>
-                        {''.join(x)}
-                    </details>
-                    <span class='jupyter-breaking-placeholder'></span><p>{delims[1]}</p>
-                </ul>
-
-            """
+        yield empty
+        return
+    head, n_elided, tail = window(container)
+    rprs = chain(htmlify_all(head),
+                 [more_items(n_elided)] if n_elided else (),
+                 htmlify_all(tail))
+    last = len(head) + bool(n_elided) + len(tail) - 1
+    yield _flat_container_open.format(delims[0])
+    for index, rpr in enumerate(rprs):
+        yield '<li>'
+        yield rpr
+        if index != last:
+            yield '<span class="post-comma">,</span>'
+        yield '</li>'
+    yield _flat_container_close.format(delims[1])
 
 
 def html_formatter_for_list(t):
@@ -218,111 +493,381 @@ def html_formatter_for_set(t):
     return html_flat_container(t, delims='{}', empty='set({})')
 
 
+def html_formatter_for_frozenset(t):
+    return html_flat_container(t, delims='{}', empty='frozenset()')
+
+
 def _inner_html_formatter_for_mapping(mapping):
-    x = []
-    for key, elem in mapping.items():
-        mimebundle = get_repr_mimebundle(elem).data
-        representation = mimebundle.get(
-            'text/html', mimebundle.get('text/html', None)) or escape(repr(elem))
-        x.append(f"""<dl class='jupyter-inner-mapping-repr'>
-                        <dt><b>{escape(str(key))}:</b></dt>
-                        <dd>{representation}</dd>
+    return ''.join(_iter_inner_html_for_mapping(mapping))
+
+
+def _iter_inner_html_for_mapping(mapping):
+    head, n_elided, tail = window(mapping.keys())
+    for key, rpr in zip(head, htmlify_all([mapping[key] for key in head])):
+        yield from _iter_html_mapping_rendered(key, rpr)
+    if n_elided:
+        yield _mapping_more.format(more_items(n_elided))
+    for key, rpr in zip(tail, htmlify_all([mapping[key] for key in tail])):
+        yield from _iter_html_mapping_rendered(key, rpr)
+
+
+_mapping_more = Template("""<dl class='jupyter-inner-mapping-repr'>
+                        <dt>{}</dt>
+                    </dl>
+                  """)
+
+_mapping_item_open = Template("""<dl class='jupyter-inner-mapping-repr'>
+                        <dt><b>{}:</b></dt>
+                        <dd>""")
+
+_mapping_item_close = Template("""</dd>
                     </dl>
                   """)
-    return ''.join(x)
 
 
+def _iter_html_mapping_item(key, elem):
+    yield from _iter_html_mapping_rendered(key, htmlify_repr(elem))
+
+
+def _iter_html_mapping_rendered(key, rpr):
+    yield _mapping_item_open.format(escape(str(key)))
+    yield rpr
+    yield str(_mapping_item_close)
+
+
+@formatter
 def html_formatter_for_mapping(mapping, *, open=True):
     if not mapping:
-        return 'dict({})'
+        yield 'dict({})'
+        return
     delims = '{}'
-    op = 'open' if open else ''
-    return f"""
-            <details class='jupyter-details'  {op}>
-                <summary>{delims[0]}</summary>
-                {_inner_html_formatter_for_mapping(mapping)}
-            </details>
-            {delims[1]}
-            """
+    yield from iter_details(delims[0], lambda: _iter_inner_html_for_mapping(mapping), open=open)
+    yield delims[1]
 
 
 html_formatter_for_dict = html_formatter_for_mapping
 
 
-def html_formatter_for_Response(req):
-    import json
-    attrs = None
+def _buffered_body(req):
+    """
+    Return the body of a `requests` response if it was already downloaded,
+    ``None`` otherwise (e.g. opened with ``stream=True`` and not read yet).
+    """
+    body = getattr(req, '_content', None)
+    if body is False or not isinstance(body, (bytes, bytearray)):
+        return None
+    return body
+
 
+_json_ws = re.compile(rb'[ \t\n\r]*')
+_json_string_end = re.compile(rb'[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+# Brackets, and whole strings so that the brackets they contain are skipped.
+_json_brackets = re.compile(rb'[{}\[\]]|"[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+_json_scalar = re.compile(rb'[^,}\]\s]*')
+_json_scalars = {b'true': 'bool', b'false': 'bool', b'null': 'NoneType'}
+
+
+def _skip_json_string(body, idx, stop):
+    """
+    Return the index after the JSON string whose opening quote is right before
+    ``idx``, or ``None`` if it does not end before ``stop``.
+    """
+    m = _json_string_end.match(body, idx, stop)
+    return m.end() if m else None
+
+
+def _skip_json_value(body, idx, stop):
+    """
+    Return the type name of the JSON value at ``idx`` and the index after it,
+    or ``None`` if it does not end before ``stop``.
+
+    Only the first character of the value is looked at to classify it,
+    containers are skipped by counting brackets without being built.
+    """
+    first = body[idx:idx + 1]
+    if first == b'"':
+        return 'str', _skip_json_string(body, idx + 1, stop)
+    if first in (b'{', b'['):
+        type_name = 'dict' if first == b'{' else 'list'
+        depth = 0
+        for m in _json_brackets.finditer(body, idx, stop):
+            char = m.group()
+            if char in (b'{', b'['):
+                depth += 1
+            elif char in (b'}', b']'):
+                depth -= 1
+                if not depth:
+                    return type_name, m.end()
+        return type_name, None
+    m = _json_scalar.match(body, idx, stop)
+    token = bytes(m.group())
+    if token in _json_scalars:
+        type_name = _json_scalars[token]
+    elif token and token[:1] in b'-0123456789':
+        type_name = 'float' if any(c in token for c in b'.eE') else 'int'
+    else:
+        raise ValueError('expected a JSON value')
+    return type_name, None if m.end() == stop < len(body) else m.end()
+
+
+def _json_top_level_keys(body, limit, budget, encoding='utf-8'):
+    """
+    Return the first ``limit`` top-level keys of the JSON object in the
+    ``body`` bytes, with the type name of their value, and whether there are
+    more.
+
+    Only the keys are decoded, and at most ``budget`` bytes are scanned: the
+    work does not grow with the size of the values. Raise ValueError if
+    ``body`` does not start like a JSON object.
+    """
+    stop = min(len(body), budget)
+    ws = lambda idx: _json_ws.match(body, idx).end()
+    idx = ws(0)
+    if body[idx:idx + 1] != b'{':
+        raise ValueError('not a JSON object')
+    idx = ws(idx + 1)
+    keys = []
+    while body[idx:idx + 1] != b'}':
+        if len(keys) == limit:
+            return keys, True
+        if body[idx:idx + 1] != b'"':
+            raise ValueError('expected a key')
+        end = _skip_json_string(body, idx + 1, stop)
+        if end is None:
+            return keys, True
+        key = json.loads(bytes(body[idx:end]).decode(encoding, errors='replace'))
+        idx = ws(end)
+        if body[idx:idx + 1] != b':':
+            raise ValueError('expected ":"')
+        type_name, idx = _skip_json_value(body, ws(idx + 1), stop)
+        keys.append((key, type_name))
+        if idx is None:
+            return keys, True
+        idx = ws(idx)
+        if body[idx:idx + 1] == b',':
+            idx = ws(idx + 1)
+    return keys, False
+
+
+def _ascii_compatible(encoding):
+    """
+    Whether the JSON punctuation is encoded as in ASCII (not e.g. in UTF-16).
+    """
+    try:
+        return '{"}'.encode(encoding) == b'{"}'
+    except LookupError:
+        return False
+
+
+def _iter_html_for_body(req, body):
+    encoding = getattr(req, 'encoding', None) or 'utf-8'
+    if len(body) <= max_json_body:
+        try:
+            json_content = json.loads(body)
+        except ValueError:
+            pass
+        else:
+            if isinstance(json_content, dict):
+                render = lambda: _iter_inner_html_for_mapping(json_content)
+            else:
+                render = lambda: htmlify_repr(json_content)
+            yield from iter_details('Content (JSON)', render)
+            return
+    elif _ascii_compatible(encoding):
+        try:
+            keys, more = _json_top_level_keys(body, max_head_items, max_json_scan, encoding)
+        except ValueError:
+            pass
+        else:
+            def render():
+                for key, type_name in keys:
+                    yield from _iter_html_mapping_item(key, HTML(f'<i>{escape(type_name)}</i>'))
+                if more:
+                    yield "<dl class='jupyter-inner-mapping-repr'><dt><span class='jupyter-more-items'>… more keys</span></dt></dl>"
+            yield from iter_details(f'Content (JSON, {len(body)} bytes, top-level keys)', render)
+            return
+    preview = body[:max_body_preview].decode(encoding, errors='replace')
+    rest = len(body) - max_body_preview
+    yield from iter_details(
+        f'Content ({len(body)} bytes)',
+        lambda: f'<pre>{escape(preview)}</pre>' + (more_items(f'{rest} bytes') if rest > 0 else ''))
+
+
+@formatter
+def html_formatter_for_Response(req):
+    """
+    The body is never read from the network: streaming responses whose body
+    was not consumed only show their Content-Length.
+    """
     def in_f(k, v):
         if k == 'headers':
             return HTML(html_formatter_for_mapping(v, open=False))
         else:
             return v
 
-    attrs = _inner_html_formatter_for_mapping(
-        {k: in_f(k, v) for (k, v) in vars(req).items() if not k.startswith('_')})
+    def content():
+        yield from _iter_inner_html_for_mapping(
+            {k: in_f(k, v) for (k, v) in vars(req).items() if not k.startswith('_')})
+        body = _buffered_body(req)
+        if body is None:
+            length = getattr(req, 'headers', {}).get('Content-Length', 'unknown')
+            yield f"<p class='jupyter-more-items'>Body not downloaded (Content-Length: {escape(str(length))})</p>"
+        else:
+            yield from _iter_html_for_body(req, body)
+
+    yield from iter_details(f'<code>{escape(repr(req))}</code>', content)
+
+
+_gen_help = Template("""
+    <code title='{}'>{}</code>
+    """)
+
+
+def _hexdump(view, start, stop):
+    """
+    Hex and ASCII dump of ``view[start:stop]``, 16 bytes per line, with offsets
+    relative to the start of the buffer.
+    """
+    chunk = view[start:stop].tobytes()
+    lines = []
+    for i in range(0, len(chunk), 16):
+        line = chunk[i:i + 16]
+        ascii_ = ''.join(chr(c) if 32 <= c < 127 else '.' for c in line)
+        hex_ = ' '.join(f'{c:02x}' for c in line)
+        lines.append(f'{start + i:08x}  {hex_:<47}  {ascii_}')
+    return escape('\n'.join(lines))
+
+
+def _byte_view(buf):
+    """
+    Return a flat memoryview of bytes on ``buf``, or ``None`` if that is not
+    possible without a copy (e.g. for a closed mmap or non contiguous views).
+    """
     try:
-        json_content = req.json()
-
-        return f"""
-            <style>
-                {thecss}
-            </style>
-            <details class='jupyter-details'><summary><code>{escape(repr(req))}</code></summary>
-                {attrs}
-                 <details class="jupyter-details">
-                    <summary>Content (JSON)</summary>
-                    {_inner_html_formatter_for_mapping(json_content)}
-                 </details>
-            </details>
-            """
-
-    except json.JSONDecodeError:
-        return f"""
-            <style>
-                {thecss}
-            </style>
-            <details class='jupyter-details'><summary><code>{escape(repr(req))}</code></summary>
-                {attrs}
-            </details>
-                """
+        view = memoryview(buf)
+    except (TypeError, ValueError):
+        return None
+    if view.format == 'B' and view.ndim == 1:
+        return view
+    with view:
+        try:
+            return view.cast('B')
+        except TypeError:
+            return None
+
+
+def _iter_html_for_pages(buf, length):
+    head, n_elided, tail = window(range(0, length, dump_page_bytes))
+    for start in head:
+        yield _html_page(buf, start, length)
+    if n_elided:
+        yield f'<p>{more_items(n_elided)} pages</p>'
+    for start in tail:
+        yield _html_page(buf, start, length)
+
+
+def _html_page(buf, start, length):
+    stop = min(start + dump_page_bytes, length)
+
+    def content():
+        view = _byte_view(buf)
+        if view is None:
+            return "<span class='jupyter-elided'>buffer not available anymore</span>"
+        with view:
+            return f'<pre>{_hexdump(view, start, stop)}</pre>'
+    return lazy_details(f'<code>{start:08x}-{stop - 1:08x}</code>', content)
+
+
+@formatter
+def html_formatter_for_buffer(buf):
+    """
+    Length and hex dump of the head and tail of a bytes-like object; only those
+    are read, through a memoryview.
+    """
+    view = _byte_view(buf)
+    if view is None:
+        return f'<code>{escape(builtins.repr(buf))}</code>'
+    with view:
+        length = view.nbytes
+        summary = f'<code>{escape(type(buf).__name__)}</code> – {length:,} bytes'
+        if length <= dump_head_bytes + dump_tail_bytes:
+            dump = f'<pre>{_hexdump(view, 0, length)}</pre>'
+        else:
+            # Keep the lines of the tail aligned on 16 bytes.
+            tail = max((length - dump_tail_bytes) // 16 * 16, dump_head_bytes)
+            dump = (f'<pre>{_hexdump(view, 0, dump_head_bytes)}</pre>'
+                    f'<p>{more_items(f"{tail - dump_head_bytes:,}")} bytes</p>'
+                    f'<pre>{_hexdump(view, tail, length)}</pre>')
+    if lazy.enabled and length > dump_head_bytes + dump_tail_bytes:
+        dump += lazy_details(f'All pages of {dump_page_bytes:,} bytes',
+                             lambda: _iter_html_for_pages(buf, length))
+    return lazy_details(summary, lambda: dump, open=repr_getter.depth == 0)
+
+
+html_formatter_for_bytes = html_formatter_for_buffer
+html_formatter_for_bytearray = html_formatter_for_buffer
+html_formatter_for_memoryview = html_formatter_for_buffer
+html_formatter_for_mmap = html_formatter_for_buffer
 
 
+@formatter
 def gen_help(obj):
     doc = next(filter(None, (x.__doc__ for x in type(obj).mro())))
-    return f"""
-    <code title='{escape(doc)}'>{escape(repr(obj))}<code>
-    """
+    return _gen_help.format(escape(doc), escape(repr(obj)))
 
 
+@formatter
 def general_repr(obj):
-    return f'<style>{thecss}</style>' +\
-           f'<details class="jupyter-details"><summary><code>{escape(repr(obj))}<code></summary>' +\
-           _inner_html_formatter_for_mapping({k: v for (k, v) in vars(obj).items() if not k.startswith('_')}) +\
-           '</details>'
+    yield from iter_details(
+        f'<code>{escape(repr(obj))}</code>',
+        lambda: _iter_inner_html_for_mapping({k: v for (k, v) in vars(obj).items() if not k.startswith('_')}))
 
 
-def html_formatter_for_type(obj):
-    try:
-        mro = obj.mro()  # [o for o in  if o is not object]
-    except TypeError:
-        mro = ()
-    if len(mro) > 1:
-        mime = get_repr_mimebundle(mro[1], include='text/html').data
-        return f'<style>{thecss}</style>' + \
-            f'<details class="jupyter-details" ><summary><code>{escape(repr(obj))}</code></summary>'\
-            + well(HTML(f"""
-                <p><code alpha>{obj.__doc__ or ''}</code></p>
+@render_cache.memoize
+def _html_ancestor(cls):
+    """
+    Html for one entry of the "Inherit from" list of a type.
+
+    Memoized, so that common ancestors – like ``object`` – are rendered once
+    for all the types displayed in a session.
+    """
+    return '<li>' + lazy_details(f'<code>{escape(repr(cls))}</code>',
+                                 lambda: well(HTML(f"<p><code alpha>{escape(cls.__doc__ or '')}</code></p>"))._repr_html_()) + '</li>'
+
+
+_type_content = Template("""
+                <p><code alpha>{}</code></p>
                 <p> Inherit from :</p>
                 <ul>
-                  <li>{mime.get('text/html')}</li>
-                </ul>"""))._repr_html_()\
-            + '</details>'
+                  {}
+                </ul>""")
+
+
+@formatter
+@render_cache.memoize
+def html_formatter_for_type(obj):
+    """
+    The ancestors are rendered in a single pass over the MRO, as a flat list,
+    without going back through the display formatter for each of them.
+    """
+    mro = getattr(obj, '__mro__', ())
+    if len(mro) > 1:
+        def content():
+            return well(HTML(_type_content.format(
+                escape(obj.__doc__ or ''), ''.join(_html_ancestor(cls) for cls in mro[1:]))))._repr_html_()
+        return lazy_details(f'<code>{escape(repr(obj))}</code>', content)
     else:
-        return f'<style>{thecss}</style>' + f'<code>{escape(repr(obj))}</code>'
+        return f'<code>{escape(repr(obj))}</code>'
 
 
+@formatter
+@render_cache.memoize
 def html_formatter_for_builtin_function_or_method(obj):
+    return lazy_details(code(repr(obj))._repr_html_(), lambda: _function_details(obj))
+
+
+@disk_cache.memoize
+def _function_details(obj):
     ip = get_ipython()
     res = {k: v for (k, v) in ip.inspector.info(obj).items() if v}
     docstring = res.get('docstring')
@@ -335,8 +880,128 @@ def html_formatter_for_builtin_function_or_method(obj):
         res['docstring'] = code(docstring)
     else:
         del res['docstring']
-    return f'<style>{thecss}</style>' + htmlify_repr(details(code(repr(obj)), well(HTML(_inner_html_formatter_for_mapping(res)))))
+    return well(HTML(_inner_html_formatter_for_mapping(res)))._repr_html_()
 
 
+@formatter
+@render_cache.memoize
 def html_formatter_for_module(obj):
-    return f'<style>{thecss}</style>' + details(code(repr(obj)), well(code(obj.__doc__ or '')))._repr_html_()
+    return lazy_details(code(repr(obj))._repr_html_(), lambda: _module_details(obj))
+
+
+@disk_cache.memoize
+def _module_details(obj):
+    return well(code(obj.__doc__ or ''))._repr_html_()
+
+
+##########################################################################
+#                    Futures                                             #
+##########################################################################
+
+# future -> [monotonic time it was first displayed, time it was seen done]
+_future_times = weakref.WeakKeyDictionary()
+
+
+def _add_done_callback(fut, callback):
+    """
+    Add a done callback to an asyncio or concurrent future, from any thread.
+    """
+    get_loop = getattr(fut, 'get_loop', None)
+    if get_loop is None:
+        fut.add_done_callback(callback)
+        return
+    try:
+        get_loop().call_soon_threadsafe(fut.add_done_callback, callback)
+    except RuntimeError:
+        # The loop is closed, the future will never complete.
+        pass
+
+
+def _future_timing(fut):
+    times = _future_times.get(fut)
+    if times is None:
+        times = _future_times[fut] = [monotonic(), None]
+        if not fut.done():
+            _add_done_callback(fut, lambda _: times.__setitem__(1, monotonic()))
+    return times
+
+
+def _future_exception(fut):
+    """
+    Return the state of a future, and its exception if it failed; never waits.
+    """
+    from asyncio import CancelledError as AsyncioCancelledError
+    from concurrent.futures import CancelledError
+    if not fut.done():
+        running = getattr(fut, 'running', None)
+        return ('running' if running is not None and running() else 'pending'), None
+    try:
+        exc = fut.exception()
+    except (CancelledError, AsyncioCancelledError):
+        return 'cancelled', None
+    return ('failed' if exc is not None else 'finished'), exc
+
+
+def _location(code, lineno):
+    return f'{code.co_filename}:{lineno} in {code.co_name}'
+
+
+def _innermost_frame(coro):
+    """
+    Frame of the innermost coroutine ``coro`` is awaiting, if suspended.
+    """
+    frame = None
+    while coro is not None:
+        frame = getattr(coro, 'cr_frame', None) or getattr(coro, 'gi_frame', None) or frame
+        coro = getattr(coro, 'cr_await', None) or getattr(coro, 'gi_yieldfrom', None)
+    return frame
+
+
+@formatter
+def html_formatter_for_future(fut):
+    """
+    State, elapsed time, current location and outcome of an asyncio Task or
+    Future, or of a concurrent.futures Future, without ever waiting for it.
+
+    Elapsed times are counted from the first time the future is displayed.
+    """
+    state, exc = _future_exception(fut)
+    first, finished = _future_timing(fut)
+    name = getattr(fut, 'get_name', lambda: None)()
+    summary = ' '.join(filter(None, (f'<code>{escape(type(fut).__name__)}</code>', escape(name or ''),
+                                     f'<b>{state}</b>')))
+
+    info = {}
+    coro = getattr(fut, 'get_coro', lambda: None)()
+    if coro is not None:
+        info['coroutine'] = code(getattr(coro, '__qualname__', builtins.repr(coro)))
+    if not fut.done():
+        info['elapsed'] = code(f'{monotonic() - first:.1f}s since first displayed')
+        frame = _innermost_frame(coro)
+        if frame is not None:
+            info['awaiting at'] = code(_location(frame.f_code, frame.f_lineno))
+    elif finished is not None:
+        info['elapsed'] = code(f'finished {finished - first:.1f}s after first displayed')
+    if exc is not None:
+        info['exception'] = code(builtins.repr(exc))
+        tb = exc.__traceback__
+        if tb is not None:
+            while tb.tb_next is not None:
+                tb = tb.tb_next
+            info['raised at'] = code(_location(tb.tb_frame.f_code, tb.tb_lineno))
+    elif state == 'finished':
+        info['result'] = fut.result()
+    return iter_details(summary, lambda: well(HTML(_inner_html_formatter_for_mapping(info)))._repr_html_(),
+                        open=repr_getter.depth == 0)
+
+
+def show_live(fut):
+    """
+    Display ``fut``, and update the display when it is done, from a done
+    callback.
+    """
+    from IPython.display import display
+    handle = display(fut, display_id=True)
+    if not fut.done():
+        _add_done_callback(fut, handle.update)
+    return handle
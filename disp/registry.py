@@ -0,0 +1,143 @@
+"""
+Registry of the formatters provided by disp, and of the types they apply to.
+
+Targets are either types, or the ``'module.QualName'`` of types which may not
+be imported yet. Formatters are either callables, or ``'module:attribute'``
+references imported on first use. Looking up the formatter of a type follows
+its MRO – so ``OrderedDict`` or ``Counter`` get the ``dict`` formatter – and is
+cached per concrete type. IPython does not cache its own lookups: formatters
+activated by group register themselves for the concrete type of the objects
+they are first called with, see :func:`pinning`.
+
+Each entry belongs to a group, which can be activated at once with
+:func:`disp.activate` – without importing the formatters until an object of
+the group is displayed.
+"""
+
+import types
+from functools import wraps
+from importlib import import_module
+
+
+def _qualname(cls):
+    return '{}.{}'.format(cls.__module__, getattr(cls, '__qualname__', cls.__name__))
+
+
+class LazyFormatter(object):
+    """
+    Formatter importing the one referenced by ``'module:attribute'`` on its
+    first call, and delegating to it.
+    """
+
+    def __init__(self, ref):
+        self._module, self.__name__ = ref.split(':')
+        self._formatter = None
+
+    def __call__(self, obj, *args, **kwargs):
+        if self._formatter is None:
+            self._formatter = getattr(import_module(self._module), self.__name__)
+        return self._formatter(obj, *args, **kwargs)
+
+
+def pinning(fmt, target, formatter):
+    """
+    Return ``formatter`` wrapped to register itself with the IPython formatter
+    ``fmt`` for the type of the objects it is called with, when it was found
+    through the MRO of a subclass of ``target`` (a type, or a ``(module,
+    name)`` pair). IPython then finds it on the first step of the MRO walk of
+    the next displays.
+    """
+    from .instrument import register
+
+    @wraps(formatter)
+    def wrapper(obj, *args, **kwargs):
+        cls = type(obj)
+        if cls is not target and (cls.__module__, cls.__name__) != target:
+            register(fmt, cls, formatter)
+        return formatter(obj, *args, **kwargs)
+    return wrapper
+
+
+class FormatterRegistry(object):
+
+    def __init__(self):
+        # target -> (formatter, group)
+        self._entries = {}
+        self._resolved = {}
+
+    def register(self, target, formatter, group=None):
+        """
+        Register ``formatter`` for ``target``, a type or a type's
+        ``'module.QualName'``.
+        """
+        self._entries[target] = (formatter, group)
+        self._resolved.clear()
+
+    def _load(self, target):
+        formatter, group = self._entries[target]
+        if isinstance(formatter, str):
+            module, attr = formatter.split(':')
+            formatter = getattr(import_module(module), attr)
+            self._entries[target] = (formatter, group)
+        return formatter
+
+    def resolve(self, cls):
+        """
+        Return the formatter for the type ``cls``, or ``None``.
+        """
+        try:
+            return self._resolved[cls]
+        except KeyError:
+            pass
+        formatter = None
+        for base in getattr(cls, '__mro__', ()):
+            for target in (base, _qualname(base)):
+                if target in self._entries:
+                    formatter = self._load(target)
+                    break
+            if formatter is not None:
+                break
+        self._resolved[cls] = formatter
+        return formatter
+
+    def group(self, group):
+        """
+        Return the ``(target, formatter)`` pairs of a group, in registration
+        order. Formatters which are not imported yet are returned as
+        :class:`LazyFormatter`.
+        """
+        return [(target, LazyFormatter(f) if isinstance(f, str) else f)
+                for target, (f, g) in list(self._entries.items()) if g == group]
+
+
+registry = FormatterRegistry()
+
+_py3only = 'disp.py3only:'
+
+for _target, _formatter in [
+        (dict, 'html_formatter_for_mapping'),
+        (list, 'html_formatter_for_list'),
+        (tuple, 'html_formatter_for_tuple'),
+        (set, 'html_formatter_for_set'),
+        (frozenset, 'html_formatter_for_frozenset'),
+]:
+    registry.register(_target, _py3only + _formatter, 'containers')
+
+for _target, _formatter in [
+        (types.FunctionType, 'html_formatter_for_builtin_function_or_method'),
+        (types.BuiltinFunctionType, 'html_formatter_for_builtin_function_or_method'),
+        (types.BuiltinMethodType, 'html_formatter_for_builtin_function_or_method'),
+        (types.MethodType, 'html_formatter_for_builtin_function_or_method'),
+        (types.ModuleType, 'html_formatter_for_module'),
+        (type, 'html_formatter_for_type'),
+        ('_asyncio.Task', 'html_formatter_for_future'),
+        ('_asyncio.Future', 'html_formatter_for_future'),
+        ('asyncio.futures.Future', 'html_formatter_for_future'),
+        ('concurrent.futures._base.Future', 'html_formatter_for_future'),
+]:
+    registry.register(_target, _py3only + _formatter, 'builtins')
+
+registry.register('requests.models.Response', _py3only + 'html_formatter_for_Response')
+
+for _target in (bytes, bytearray, memoryview, 'mmap.mmap'):
+    registry.register(_target, _py3only + 'html_formatter_for_buffer')
@@ -1,35 +1,202 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
+"""
+Formatters for Spark objects.
+
+Most attributes of Spark objects are read from the JVM through py4j, which can
+block for seconds on a busy driver. They are fetched concurrently on a small
+thread pool with a hard ``timeout``, and cached per object for ``ttl`` seconds;
+fields that did not arrive in time are rendered as such, and will be picked up
+by the next display if they arrive later.
+"""
+
+import weakref
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from html import escape
+from itertools import count
+from time import monotonic
+
+from .template import Template
+
+
+# Seconds to wait for all the fields of an object.
+timeout = 1.0
+
+# Seconds during which fetched fields are reused.
+ttl = 30.0
+
+max_workers = 4
+
+_executor = None
+_cache = weakref.WeakKeyDictionary()
+
+
+class _Failed(object):
+
+    def __init__(self, exc):
+        self.exc = exc
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='disp-spark')
+    return _executor
+
+
+class _Fields(object):
+    """
+    Cache entry: fetched values and in-flight fetches of an object's fields.
+    """
+
+    def __init__(self):
+        self.fetched = monotonic()
+        self.values = {}
+        self.pending = {}
+
+    def store(self, name, future):
+        exc = future.exception()
+        self.values[name] = _Failed(exc) if exc is not None else future.result()
+        self.pending.pop(name, None)
+
+
+def fetch_fields(obj, getters):
+    """
+    Return ``{name: value}`` for each ``name, getter`` of ``getters``, with the
+    value being ``getter(obj)``.
+
+    Getters run concurrently, for at most ``timeout`` seconds in total; the
+    value of the fields which did not complete in time is absent. Values are
+    cached for ``ttl`` seconds, and a field still being fetched by a previous
+    call is waited for rather than fetched again.
+    """
+    return fetch_many([(obj, getters)])[0]
+
+
+def fetch_many(requests):
+    """
+    Same as :func:`fetch_fields` for each ``(obj, getters)`` of ``requests``,
+    all fetched concurrently within a single ``timeout``.
+    """
+    futures = {}
+    entries = [_submit(obj, getters, futures) for obj, getters in requests]
+    if futures:
+        done, _ = wait(futures, timeout=timeout)
+        # wait() can return before the callbacks of the completed futures ran.
+        for future in done:
+            entry, name = futures[future]
+            entry.store(name, future)
+    return [{name: entry.values[name] for name in getters if name in entry.values}
+            for entry, (obj, getters) in zip(entries, requests)]
+
+
+def _submit(obj, getters, futures):
+    """
+    Return the cache entry of ``obj``, after submitting the getters of the
+    fields it misses; add the futures to wait for to ``futures``, mapped to
+    ``(entry, name)``.
+    """
+    try:
+        entry = _cache.get(obj)
+    except TypeError:
+        entry = None
+    if entry is None or monotonic() - entry.fetched > ttl:
+        entry = _Fields()
+        try:
+            _cache[obj] = entry
+        except TypeError:
+            # Not weak-referenceable, do not cache.
+            pass
+
+    for name, getter in getters.items():
+        if name in entry.values:
+            continue
+        future = entry.pending.get(name)
+        if future is None:
+            future = entry.pending[name] = _get_executor().submit(getter, obj)
+            # Stores the fields arriving after the timeout, for the next call.
+            future.add_done_callback(lambda f, name=name: entry.store(name, f))
+        futures[future] = (entry, name)
+    return entry
+
+
+def _field(fields, name):
+    """
+    Return the html of a field from :func:`fetch_fields`.
+    """
+    if name not in fields:
+        return '<i title="timed out">…</i>'
+    value = fields[name]
+    if isinstance(value, _Failed):
+        return '<i title="{}">error</i>'.format(escape(repr(value.exc)))
+    return escape(str(value))
+
+
+def _missing(fields, getters):
+    missing = [name for name in getters if name not in fields]
+    if not missing:
+        return ''
+    return '<p><i>Timed out after {}s: {}</i></p>'.format(timeout, ', '.join(missing))
 
 
 def fully_qualified_name(m):
     return (m.__module__ + "." if hasattr(m, "__module__") else "") + m.__class__.__name__
 
 
+_context_getters = {
+    'uiWebUrl': lambda sc: sc.uiWebUrl,
+    'version': lambda sc: sc.version,
+    'master': lambda sc: sc.master,
+    'appName': lambda sc: sc.appName,
+}
+
+
 def repr_spark_context_html(sc):
     '''
     Carry over from the Spark 2.2.0 _repr_html_ for spark contexts
 
     Works on objects whose fully qualified name is 'pyspark.context.SparkContext'
     '''
-    return """
+    return _context_html(fetch_fields(sc, _context_getters))
+
+
+def _context_html(fields):
+    if 'uiWebUrl' in fields and not isinstance(fields['uiWebUrl'], _Failed):
+        ui = '<a href="{}">Spark UI</a>'.format(escape(str(fields['uiWebUrl']), quote=True))
+    else:
+        ui = 'Spark UI ' + _field(fields, 'uiWebUrl')
+    return _context_template.format(
+        ui=ui,
+        version=_field(fields, 'version'),
+        master=_field(fields, 'master'),
+        appName=_field(fields, 'appName'),
+        missing=_missing(fields, _context_getters),
+    )
+
+
+_context_template = Template("""
     <div>
         <p><b>SparkContext</b></p>
 
-        <p><a href="{sc.uiWebUrl}">Spark UI</a></p>
+        <p>{ui}</p>
 
         <dl>
           <dt>Version</dt>
-            <dd><code>v{sc.version}</code></dd>
+            <dd><code>v{version}</code></dd>
           <dt>Master</dt>
-            <dd><code>{sc.master}</code></dd>
+            <dd><code>{master}</code></dd>
           <dt>AppName</dt>
-            <dd><code>{sc.appName}</code></dd>
+            <dd><code>{appName}</code></dd>
         </dl>
+        {missing}
     </div>
-    """.format(
-        sc=sc
-    )
+    """)
+
+
+_session_getters = {
+    'catalogImplementation': lambda session: session.conf.get("spark.sql.catalogImplementation"),
+}
 
 
 def repr_spark_session_html(session):
@@ -38,12 +205,387 @@ def repr_spark_session_html(session):
 
     Works on objects whose fully qualified name is 'pyspark.sql.session.SparkSession'
     '''
-    return """
+    # Fetched together, to wait for at most one timeout.
+    fields, sc_fields = fetch_many([(session, _session_getters), (session.sparkContext, _context_getters)])
+    return _session_template.format(
+        catalogImplementation=_field(fields, 'catalogImplementation'),
+        missing=_missing(fields, _session_getters),
+        sc_HTML=_context_html(sc_fields)
+    )
+
+
+_session_template = Template("""
         <div>
             <p><b>SparkSession - {catalogImplementation}</b></p>
+            {missing}
             {sc_HTML}
         </div>
-    """.format(
-        catalogImplementation=session.conf.get("spark.sql.catalogImplementation"),
-        sc_HTML=repr_sc(session.sparkContext)
-    )
+    """)
+
+
+##########################################################################
+#                    DataFrame preview                                   #
+##########################################################################
+
+# Caps of a DataFrame preview: it shows at most ``preview_rows`` rows, and at
+# most ``preview_bytes`` characters of cell values, fetched within at most
+# ``preview_timeout`` seconds – after which the Spark jobs are cancelled. String
+# and binary columns are truncated by Spark before reaching the driver; values of
+# other types (arrays, maps, structs…) are only truncated for display.
+preview_rows = 20
+preview_bytes = 64 * 1024
+preview_timeout = 5.0
+
+# Number of previews kept, keyed by the semantic hash of the query plan. They
+# are reused for ``ttl`` seconds, by DataFrames with the same semantics as the
+# one they were collected from – the 32-bit hash alone can collide.
+max_previews = 64
+
+_previews = OrderedDict()
+_job_groups = count()
+
+_dataframe_getters = {
+    'schema': lambda df: df.schema,
+    'plan': lambda df: df.semanticHash(),
+}
+
+
+class _Preview(object):
+
+    def __init__(self, rows, more):
+        self.rows = rows
+        self.more = more
+
+
+def _truncated(df):
+    """
+    Return ``df`` with its string and binary columns truncated to
+    ``preview_bytes`` (plus one, to tell that they were), or ``df`` itself if
+    they cannot be selected by name.
+    """
+    try:
+        from pyspark.sql import functions
+    except ImportError:
+        return df
+    fields = df.schema.fields
+    names = [f.name for f in fields]
+    if len(set(names)) != len(names):
+        return df
+    columns = []
+    truncated = False
+    for f in fields:
+        column = functions.col('`{}`'.format(f.name.replace('`', '``')))
+        if f.dataType.simpleString() in ('string', 'binary'):
+            column = functions.substring(column, 1, preview_bytes + 1).alias(f.name)
+            truncated = True
+        columns.append(column)
+    return df.select(*columns) if truncated else df
+
+
+def _collect_preview(df, group):
+    """
+    Collect the first rows of ``df``, as tuples, in the job group ``group``.
+
+    Run on the executor thread, as job groups are local to the thread
+    submitting the jobs.
+    """
+    session = df.sparkSession
+    session.sparkContext.setJobGroup(group, 'disp DataFrame preview', interruptOnCancel=True)
+    limited = _truncated(df.limit(preview_rows + 1))
+    arrow = session.conf.get('spark.sql.execution.arrow.pyspark.enabled', 'false').lower() == 'true'
+    if arrow and hasattr(limited, '_collect_as_arrow'):
+        rows = []
+        for batch in limited._collect_as_arrow():
+            rows.extend(zip(*(column.to_pylist() for column in batch.columns)))
+    else:
+        rows = [tuple(row) for row in limited.collect()]
+    return _Preview(rows[:preview_rows], len(rows) > preview_rows)
+
+
+def _same_semantics(df, other):
+    """
+    Whether ``df`` and ``other`` have the same semantics, ``False`` if it
+    could not be told within ``timeout`` seconds.
+    """
+    if df is other:
+        return True
+    future = _get_executor().submit(df.sameSemantics, other)
+    done, _ = wait([future], timeout=timeout)
+    if not done or future.exception() is not None:
+        return False
+    return bool(future.result())
+
+
+def fetch_preview(df, plan):
+    """
+    Return the :class:`_Preview` of ``df``, from the cache of previews of the
+    query plan ``plan`` if possible (``None`` is never cached). Return ``None``
+    if it could not be collected within ``preview_timeout`` seconds; the jobs
+    it started are cancelled.
+    """
+    entry = _previews.get(plan) if plan is not None else None
+    if entry is not None:
+        cached, preview, fetched = entry
+        if monotonic() - fetched <= ttl and _same_semantics(df, cached):
+            _previews.move_to_end(plan)
+            return preview
+    group = 'disp-preview-{}'.format(next(_job_groups))
+    future = _get_executor().submit(_collect_preview, df, group)
+    done, _ = wait([future], timeout=preview_timeout)
+    if not done:
+        future.cancel()
+        df.sparkSession.sparkContext.cancelJobGroup(group)
+        return None
+    preview = future.result()
+    if plan is None:
+        return preview
+    _previews[plan] = (df, preview, monotonic())
+    _previews.move_to_end(plan)
+    while len(_previews) > max_previews:
+        _previews.popitem(last=False)
+    return preview
+
+
+def _cell(value):
+    if value is None:
+        return '<i>null</i>'
+    text = str(value)
+    if len(text) > preview_bytes:
+        text = text[:preview_bytes] + '…'
+    return escape(text)
+
+
+def _preview_rows(preview):
+    """
+    Html rows of the preview, until ``preview_bytes`` characters of values.
+    """
+    size = 0
+    rows = []
+    for row in preview.rows:
+        cells = [_cell(value) for value in row]
+        size += sum(len(cell) for cell in cells)
+        if size > preview_bytes and rows:
+            return rows, True
+        rows.append('<tr>{}</tr>'.format(''.join('<td>{}</td>'.format(cell) for cell in cells)))
+    return rows, preview.more
+
+
+def _note(html):
+    return '<p><i>{}</i></p>'.format(html)
+
+
+def repr_spark_dataframe_html(df):
+    """
+    Schema of a DataFrame, and a preview of its first rows.
+
+    The preview is collected with ``limit()``, through Arrow if enabled, and
+    capped in rows, size and time, so that displaying a DataFrame never runs a
+    full job; it is cached per query plan.
+
+    Works on objects whose fully qualified name is
+    'pyspark.sql.dataframe.DataFrame'.
+    """
+    fields = fetch_fields(df, _dataframe_getters)
+    schema = fields.get('schema')
+    if schema is None or isinstance(schema, _Failed):
+        return _dataframe_template.format(columns='', header='', rows='',
+                                          note=_note('Schema ' + _field(fields, 'schema')))
+    columns = ''.join('<li><code>{}</code>: {}{}</li>'.format(
+        escape(f.name), escape(f.dataType.simpleString()), '' if f.nullable else ' (not null)')
+        for f in schema.fields)
+    header = ''.join('<th>{}</th>'.format(escape(f.name)) for f in schema.fields)
+
+    # Without a plan hash (before Spark 3.1, or timed out) the preview is
+    # still collected, but not cached.
+    plan = fields.get('plan')
+    if isinstance(plan, _Failed):
+        plan = None
+    try:
+        preview = fetch_preview(df, plan)
+    except Exception as e:
+        return _dataframe_template.format(columns=columns, header=header, rows='',
+                                          note=_note('Preview failed: <code>{}</code>'.format(escape(repr(e)))))
+    if preview is None:
+        return _dataframe_template.format(columns=columns, header=header, rows='',
+                                          note=_note('Preview timed out after {}s'.format(preview_timeout)))
+    rows, more = _preview_rows(preview)
+    note = _note('Only showing the first {} rows'.format(len(rows))) if more else ''
+    return _dataframe_template.format(columns=columns, header=header, rows=''.join(rows), note=note)
+
+
+_dataframe_template = Template("""
+        <div>
+            <details>
+                <summary><b>DataFrame</b> – schema</summary>
+                <ul>{columns}</ul>
+            </details>
+            <table>
+              <tr>{header}</tr>
+              {rows}
+            </table>
+            {note}
+        </div>
+    """)
+
+
+##########################################################################
+#                    Live progress                                       #
+##########################################################################
+
+class ProgressPanel(object):
+    """
+    Live view of the active jobs and stages of a SparkContext.
+
+    A single background thread per context polls ``sc.statusTracker()`` and
+    updates the last ``max_displays`` displays of the panel in place, with
+    ``update_display``; displays that fail to update are forgotten.
+    Updates are only sent when something changed, at most every
+    ``min_interval`` seconds; while nothing changes the polling interval
+    doubles, up to ``max_interval`` seconds.
+
+    Use :func:`show_progress` rather than instantiating this directly.
+    """
+
+    min_interval = 0.5
+    max_interval = 10.0
+    max_displays = 3
+
+    def __init__(self, sc):
+        import threading
+        self._sc = weakref.ref(sc)
+        self._handles = deque(maxlen=self.max_displays)
+        self._last = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def snapshot(self, sc):
+        """
+        Return the progress of the active jobs of ``sc``, as nested tuples.
+        """
+        tracker = sc.statusTracker()
+        jobs = []
+        for job_id in sorted(tracker.getActiveJobsIds()):
+            job = tracker.getJobInfo(job_id)
+            if job is None:
+                continue
+            stages = []
+            for stage_id in sorted(job.stageIds):
+                stage = tracker.getStageInfo(stage_id)
+                if stage is None:
+                    continue
+                stages.append((stage.stageId, stage.name, stage.numTasks, stage.numActiveTasks,
+                               stage.numCompletedTasks, stage.numFailedTasks))
+            jobs.append((job.jobId, str(job.status), tuple(stages)))
+        return tuple(jobs), _executor_count(sc, tracker)
+
+    def to_html(self, snapshot):
+        jobs, executors = snapshot
+        rows = []
+        for job_id, status, stages in jobs:
+            for stage_id, name, total, active, completed, failed in stages:
+                rows.append(_progress_row.format(job_id=job_id, stage_id=stage_id, name=escape(str(name)),
+                            completed=completed, total=max(total, 1), active=active, failed=failed))
+        if not rows:
+            rows.append('<tr><td colspan="5"><i>No active jobs</i></td></tr>')
+        return _progress_template.format(jobs=len(jobs), executors='?' if executors is None else executors, rows=''.join(rows))
+
+    def attach(self):
+        """
+        Display the panel, and start polling if needed.
+        """
+        from IPython.display import HTML, display
+        sc = self._sc()
+        snapshot = self.snapshot(sc)
+        handle = display(HTML(self.to_html(snapshot)), display_id=True)
+        self._handles.append(handle)
+        self._last = snapshot
+        if self._thread is None or not self._thread.is_alive():
+            import threading
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._poll, name='disp-spark-progress', daemon=True)
+            self._thread.start()
+        return handle
+
+    def stop(self):
+        self._stop.set()
+
+    def _poll(self):
+        from IPython.display import HTML
+        interval = self.min_interval
+        while not self._stop.wait(interval):
+            sc = self._sc()
+            if sc is None:
+                return
+            try:
+                snapshot = self.snapshot(sc)
+            except Exception:
+                # The context is most likely stopped.
+                return
+            if snapshot == self._last:
+                interval = min(interval * 2, self.max_interval)
+                continue
+            self._last = snapshot
+            interval = self.min_interval
+            html = HTML(self.to_html(snapshot))
+            for handle in list(self._handles):
+                try:
+                    handle.update(html)
+                except Exception:
+                    try:
+                        self._handles.remove(handle)
+                    except ValueError:
+                        pass
+
+
+_progress_row = Template("""
+            <tr>
+              <td>{job_id}</td><td>{stage_id}</td><td><code>{name}</code></td>
+              <td><progress value="{completed}" max="{total}"></progress></td>
+              <td>{completed}/{total} ({active} running, {failed} failed)</td>
+            </tr>""")
+
+_progress_template = Template("""
+        <div>
+            <p><b>Spark progress</b> – {jobs} active jobs, {executors} executors</p>
+            <table>
+              <tr><th>Job</th><th>Stage</th><th>Name</th><th>Tasks</th><th></th></tr>
+              {rows}
+            </table>
+        </div>
+        """)
+
+
+def _executor_count(sc, tracker):
+    if hasattr(tracker, 'getExecutorInfos'):
+        return len(tracker.getExecutorInfos())
+    try:
+        # Includes the driver.
+        return sc._jsc.sc().getExecutorMemoryStatus().size() - 1
+    except Exception:
+        return None
+
+
+_panels = weakref.WeakKeyDictionary()
+
+
+def show_progress(sc):
+    """
+    Display a live progress panel for the jobs of ``sc`` (a SparkContext or a
+    SparkSession), updated in place while the jobs run.
+
+    All the panels of a context share a single poller, which only updates the
+    last ``ProgressPanel.max_displays`` of them; call ``stop_progress(sc)`` to
+    stop updating them.
+    """
+    sc = getattr(sc, 'sparkContext', sc)
+    panel = _panels.get(sc)
+    if panel is None:
+        panel = _panels[sc] = ProgressPanel(sc)
+    return panel.attach()
+
+
+def stop_progress(sc):
+    sc = getattr(sc, 'sparkContext', sc)
+    panel = _panels.pop(sc, None)
+    if panel is not None:
+        panel.stop()
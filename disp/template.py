@@ -0,0 +1,47 @@
+"""
+Html and CSS templates, with a compact variant.
+
+Templates are written indented for readability, but that indentation would be
+repeated in the output for every element of a container. Each template is thus
+also minified once, when it is defined; ``compact`` (on by default) selects
+which variant is used.
+"""
+
+import re
+
+
+compact = True
+
+
+def minify_html(source):
+    """
+    Remove newlines and the indentation around them.
+
+    Only meant for templates: text content spanning several lines would be
+    joined without spaces.
+    """
+    return re.sub(r'\s*\n\s*', '', source)
+
+
+def minify_css(source):
+    source = re.sub(r'/\*.*?\*/', '', source, flags=re.S)
+    source = re.sub(r'\s+', ' ', source)
+    return re.sub(r'\s*([{};,])\s*', r'\1', source).strip()
+
+
+class Template(object):
+    """
+    A ``str.format`` template, with its pretty and compact variants.
+    """
+
+    __slots__ = ('pretty', 'compact')
+
+    def __init__(self, source, minify=minify_html):
+        self.pretty = source
+        self.compact = minify(source)
+
+    def __str__(self):
+        return self.compact if compact else self.pretty
+
+    def format(self, *args, **kwargs):
+        return (self.compact if compact else self.pretty).format(*args, **kwargs)
@@ -1,8 +1,15 @@
 
 try:
-    from IPython.core import DataMetadata, RecursiveObject, ReprGetter, get_repr_mimebundle
+    from IPython.core import (DataMetadata, ElidedObject, RecursiveObject, RenderBudget, ReprGetter,
+                             SharedObject, get_repr_mimebundle, repr_getter)
 except ImportError:
     from collections import namedtuple
+    from contextlib import contextmanager
+    from contextvars import ContextVar
+    from copy import copy
+    from threading import Lock
+    from weakref import WeakKeyDictionary
+    from time import monotonic, perf_counter
 
     class RecursiveObject:
         """
@@ -25,6 +32,102 @@ except ImportError:
 
 
 
+    class ElidedObject:
+        """
+        Placeholder rendered instead of an object once the :class:`RenderBudget`
+        of the current rendering is exhausted.
+
+        You may register a formatter for this object that will be call when
+        the budget runs out.
+        """
+
+        def __init__(self, obj, reason):
+            self.type_name = type(obj).__name__
+            self.reason = reason
+
+        def __repr__(self):
+            if self.reason == 'slow':
+                return '<{} not shown: slow to render>'.format(self.type_name)
+            return '<{} not shown: {} budget exhausted>'.format(self.type_name, self.reason)
+
+        def _repr_html_(self):
+            import html
+            return "<details class='jupyter-details jupyter-elided'><summary>…</summary>{}</details>".format(
+                html.escape(repr(self)))
+
+
+    class SharedObject:
+        """
+        Back-reference rendered instead of an object that was already rendered
+        earlier in the same top-level rendering.
+
+        You may register a formatter for this object that will be call when
+        an object is encountered again.
+        """
+
+        def __init__(self, obj):
+            self.type_name = type(obj).__name__
+            self.id = id(obj)
+
+        def __repr__(self):
+            return '<same {} as above, at {:#x}>'.format(self.type_name, self.id)
+
+        def _repr_html_(self):
+            import html
+            return "<code class='jupyter-backref'>{}</code>".format(html.escape(repr(self)))
+
+
+    class RenderBudget:
+        """
+        Limits on the work done while computing a single top-level representation.
+
+        ``max_depth`` bounds the nesting of :any:`get_repr_mimebundle` calls,
+        ``max_chars`` the total number of characters emitted by nested
+        representations, ``max_calls`` the number of nested formatter calls and
+        ``max_seconds`` the wall time since the start of the rendering (a
+        representation already being computed is not interrupted, but the
+        following ones are elided). Any of them can be ``None`` to disable that
+        limit.
+
+        Each top-level rendering works on a fresh copy of the budget of its
+        :class:`ReprGetter`; ``elided`` is the number of objects that were not
+        rendered because the budget was exhausted, ``shared`` the number of
+        objects rendered as a back-reference.
+        """
+
+        __slots__ = ('max_depth', 'max_chars', 'max_calls', 'max_seconds', 'deadline',
+                     'chars', 'calls', 'elided', 'shared')
+
+        def __init__(self, max_depth=20, max_chars=2000000, max_calls=10000, max_seconds=2.0):
+            self.max_depth = max_depth
+            self.max_chars = max_chars
+            self.max_calls = max_calls
+            self.max_seconds = max_seconds
+            self.reset()
+
+        def reset(self):
+            self.chars = 0
+            self.calls = 0
+            self.elided = 0
+            self.shared = 0
+            self.deadline = None if self.max_seconds is None else monotonic() + self.max_seconds
+
+        def exhausted(self, depth=0):
+            """
+            Return the name of the first exhausted limit at nesting ``depth``,
+            or ``None``.
+            """
+            if self.max_depth is not None and depth >= self.max_depth:
+                return 'depth'
+            if self.max_chars is not None and self.chars >= self.max_chars:
+                return 'size'
+            if self.max_calls is not None and self.calls >= self.max_calls:
+                return 'calls'
+            if self.deadline is not None and monotonic() >= self.deadline:
+                return 'time'
+            return None
+
+
     DataMetadata = namedtuple('DataMetadata', ('data','metadata'))
 
 
@@ -35,14 +138,118 @@ except ImportError:
 
         useful when computing representation concurrently of nested object that may
         refer to common resources.
+
+        The state – objects being rendered, nesting depth and budget of the
+        current top-level rendering – is stored in context variables, so a
+        single instance can be used from several threads or asyncio tasks at
+        once. Renderings that should share state across threads must run in a
+        copy of the current context (see :func:`contextvars.copy_context`).
+
+        Types whose own representation (excluding the nested ones) took at
+        least ``slow_seconds`` are recorded in ``slow_types``, with the longest
+        time seen. If ``skip_slow`` is set – it is not by default, as a
+        rendering stalled by another thread would be enough to record a type –
+        nested objects of those types are then elided right away in later
+        renderings, up to ``max_slow_skips`` times after which the type is
+        forgotten and gets another chance. Clear ``slow_types`` to give them
+        all another chance.
         """
 
-        __slots__ = ('_objs',)
+        __slots__ = ('_objs', '_depth', '_budget', '_limits', '_shared', '_nested', '_lock', 'dedupe',
+                     'min_shared_chars', 'slow_types', 'slow_seconds', 'skip_slow', 'max_slow_skips',
+                     '_slow_skips')
+
+        # Objects of these types are not worth a back-reference.
+        _never_shared = frozenset((int, float, complex, str, bytes, bool, type(None)))
+
+        def __init__(self, budget=None):
+            self._objs = ContextVar('disp_repr_objs', default=frozenset())
+            self._depth = ContextVar('disp_repr_depth', default=0)
+            self._budget = ContextVar('disp_repr_budget', default=None)
+            self._shared = ContextVar('disp_repr_shared', default=None)
+            self._limits = RenderBudget() if budget is None else budget
+            # Render objects referenced several times in a top-level rendering
+            # once, and as a back-reference afterward, if their representation
+            # is at least `min_shared_chars` long.
+            self.dedupe = True
+            self.min_shared_chars = 200
+            # Time spent in the nested calls of the current one, and size of
+            # their output.
+            self._nested = ContextVar('disp_repr_nested', default=None)
+            # Nested calls can run concurrently in copies of the context (see
+            # disp.py3only.htmlify_all): the counters of the budget and of
+            # _nested they share, and the slow types, are only updated with
+            # this lock held.
+            self._lock = Lock()
+            # Weakly keyed, so that classes created on the fly are not kept
+            # alive once recorded.
+            self.slow_types = WeakKeyDictionary()
+            self.slow_seconds = 0.5
+            self.skip_slow = False
+            self.max_slow_skips = 20
+            # Number of times each type of slow_types was elided since recorded.
+            self._slow_skips = WeakKeyDictionary()
+
+        def _skip_slow(self, cls):
+            """
+            Whether to elide an object of type ``cls`` as slow to render.
+            """
+            if not self.skip_slow:
+                return False
+            with self._lock:
+                if cls not in self.slow_types:
+                    return False
+                skips = self._slow_skips.get(cls, 0) + 1
+                if self.max_slow_skips is not None and skips > self.max_slow_skips:
+                    self.slow_types.pop(cls, None)
+                    self._slow_skips.pop(cls, None)
+                    return False
+                self._slow_skips[cls] = skips
+                return True
+
+        @property
+        def budget(self):
+            """
+            The :class:`RenderBudget` of the current rendering, or outside of any
+            rendering the one used as a template by the next ones.
+            """
+            budget = self._budget.get()
+            return self._limits if budget is None else budget
+
+        @budget.setter
+        def budget(self, budget):
+            self._limits = budget
+
+        @property
+        def depth(self):
+            """
+            Nesting depth of :any:`get_repr_mimebundle` calls in the current context.
+            """
+            return self._depth.get()
+
+        @contextmanager
+        def render(self):
+            """
+            Delimit a top-level rendering.
 
-        def __init__(self):
-            self._objs = set()
+            The outermost ``render()`` starts from a fresh copy of the budget;
+            nested uses are no-ops. Yield whether this is the outermost one.
+            """
+            if self._budget.get() is not None:
+                yield False
+                return
+            budget = copy(self._limits)
+            budget.reset()
+            token = self._budget.set(budget)
+            shared_token = self._shared.set({})
+            try:
+                yield True
+            finally:
+                self._shared.reset(shared_token)
+                self._budget.reset(token)
 
-        def get_repr_mimebundle(self, obj, include=None, exclude=None, *, on_recursion=RecursiveObject):
+        def get_repr_mimebundle(self, obj, include=None, exclude=None, *, on_recursion=RecursiveObject,
+                                on_elision=ElidedObject, on_shared=SharedObject):
             """
             return the representations of an object and associated metadata.
 
@@ -70,6 +277,13 @@ except ImportError:
             on_recursion: callable
                 Return an object to compute the representation when recursion is
                 detected.
+            on_elision: callable
+                Return an object to compute the representation when the
+                :class:`RenderBudget` is exhausted, called with the object and
+                the name of the exhausted limit.
+            on_shared: callable
+                Return an object to compute the representation when the object
+                was already rendered in the current top-level rendering.
 
 
             Returns
@@ -86,9 +300,20 @@ except ImportError:
             attempt to return the representation of :class:`RecursiveObject`. You
             may register extra formatter for :class:`RecursiveObject`.
 
-            If you are computing objects representation in a concurrent way (thread,
-            coroutines, ...), you should make sure to instanciate a
-            :class:`ReprGetter` object and use one per task to avoid race conditions.
+            Each call counts against the :class:`RenderBudget` of the current
+            rendering; once it is exhausted – or with ``skip_slow`` right away
+            for nested objects of a type in ``slow_types`` – the representation
+            of :class:`ElidedObject` is returned instead and ``budget.elided``
+            is incremented.
+
+            Within a top-level rendering, an object met again after it was
+            rendered is replaced by a :class:`SharedObject` back-reference, so
+            the work depends on the number of distinct objects, not on the number
+            of references to them. Set ``dedupe`` to False to disable this.
+
+            The recursion state is local to the current context, so computing
+            objects representation in a concurrent way (thread, coroutines, ...)
+            is safe with a shared :class:`ReprGetter`.
 
             If a specific mimetype formatter need to call `get_repr_mimebundle()`
             for another mimeformat, then it must pass the mimetypes values it desire
@@ -109,16 +334,68 @@ except ImportError:
             fmt = InteractiveShell.instance().display_formatter.format
             if id(obj) == id(object):
                 return DataMetadata({'text/plain':"<class 'object'>"}, {})
-            if self._objs.intersection(keys):
+            objs = self._objs.get()
+            # Whether obj is rendered as part of another object.
+            inner = self._budget.get() is not None
+            if objs.intersection(keys):
                 return DataMetadata(*fmt(on_recursion(obj), include=include, exclude=exclude))
-            else:
+            with self.render():
+                shared = self._shared.get() if self.dedupe and type(obj) not in self._never_shared else None
+                shared_key = (id(obj), tuple(include) if include else None)
+                if shared is not None and shared.get(shared_key) is obj:
+                    with self._lock:
+                        self.budget.shared += 1
+                    return DataMetadata(*fmt(on_shared(obj), include=include, exclude=exclude))
+                budget = self.budget
+                depth = self._depth.get()
+                if inner and self._skip_slow(type(obj)):
+                    reason = 'slow'
+                else:
+                    reason = budget.exhausted(depth)
+                if reason:
+                    with self._lock:
+                        budget.elided += 1
+                    return DataMetadata(*fmt(on_elision(obj, reason), include=include, exclude=exclude))
+                with self._lock:
+                    budget.calls += 1
+                    elided = budget.elided
+                objs_token = self._objs.set(objs.union(keys))
+                depth_token = self._depth.set(depth + 1)
+                # [time, chars] of the nested calls.
+                nested = [0.0, 0]
+                nested_token = self._nested.set(nested)
+                start = perf_counter()
                 try:
-                    self._objs.update(keys)
-                    return DataMetadata(*fmt(obj, include=include, exclude=exclude))
+                    data, metadata = fmt(obj, include=include, exclude=exclude)
                 finally:
-                    self._objs.difference_update(keys)
+                    elapsed = perf_counter() - start
+                    self._nested.reset(nested_token)
+                    self._depth.reset(depth_token)
+                    self._objs.reset(objs_token)
+                    outer = self._nested.get()
+                    if outer is not None:
+                        with self._lock:
+                            outer[0] += elapsed
+                    if elapsed - nested[0] >= self.slow_seconds:
+                        cls = type(obj)
+                        with self._lock:
+                            self.slow_types[cls] = max(self.slow_types.get(cls, 0.0), elapsed - nested[0])
+                            self._slow_skips.pop(cls, None)
+                # The output of nested calls, already counted, is part of ours:
+                # only count the rest.
+                size = sum(len(v) for v in data.values() if isinstance(v, str))
+                with self._lock:
+                    budget.chars += size - nested[1]
+                    if outer is not None:
+                        outer[1] += size
+                # Only complete renderings can be referred to; keeping a
+                # reference to obj also keeps its id from being reused.
+                if shared is not None and size >= self.min_shared_chars and budget.elided == elided:
+                    shared[shared_key] = obj
+                return DataMetadata(data, metadata)
 
     # Expose this for convenience at the top level. Similar to what the random
-    # module in python does. If you want to avoid weird behavior from concurrency:
-    #   Instantiate your own.
-    get_repr_mimebundle = ReprGetter().get_repr_mimebundle
+    # module in python does. Its state is context-local, so it is safe to share
+    # between threads and tasks.
+    repr_getter = ReprGetter()
+    get_repr_mimebundle = repr_getter.get_repr_mimebundle
@@ -0,0 +1,16 @@
+import pytest
+from IPython.core.interactiveshell import InteractiveShell
+
+
+@pytest.fixture
+def shell():
+    """
+    Headless shell rendering all mimetypes, with the disp containers and
+    builtins formatters activated.
+    """
+    import disp
+    ip = InteractiveShell.instance()
+    ip.display_formatter.active_types = list(ip.display_formatter.formatters)
+    disp.activate_containers()
+    disp.activate_builtins()
+    return ip
@@ -0,0 +1,32 @@
+import mmap
+from html import escape
+
+from disp import py3only
+
+
+def test_hexdump_lines(shell):
+    html = py3only.html_formatter_for_buffer(bytearray(b'HEADER\x00\x01hello world'))
+    assert '00000000  48 45 41 44 45 52 00 01 68 65 6c 6c 6f 20 77 6f  HEADER..hello wo' in html
+    assert '00000010  72 6c 64' in html
+    assert '19 bytes' in html
+
+
+def test_large_buffer_only_dumps_head_and_tail(shell):
+    data = bytes(range(256)) * 4096
+    html = py3only.html_formatter_for_buffer(memoryview(data))
+    assert f'{len(data):,} bytes' in html
+    assert html.count('\n') < (py3only.dump_head_bytes + py3only.dump_tail_bytes) // 16 + 10
+    assert f'{len(data) - 16:08x}' in html
+
+
+def test_mmap_can_be_closed_after_display(shell, tmp_path):
+    path = tmp_path / 'data'
+    path.write_bytes(b'x' * 100000)
+    with open(path, 'r+b') as f:
+        mm = mmap.mmap(f.fileno(), 0)
+        assert '100,000 bytes' in py3only.html_formatter_for_buffer(mm)
+        mm.close()
+    # Falls back to the repr, whose text depends on the Python version.
+    html = py3only.html_formatter_for_buffer(mm)
+    assert html.endswith(f'<code>{escape(repr(mm))}</code>')
+    assert '<pre>' not in html
@@ -0,0 +1,64 @@
+import json
+import os
+import sys
+import types
+
+import pytest
+
+from disp import py3only
+from disp.diskcache import DiskCache, disk_cache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = DiskCache(str(tmp_path / 'render_cache.sqlite'))
+    cache.enabled = True
+    return cache
+
+
+def render(obj):
+    return f'<b>{obj.__name__}</b>'
+
+
+def test_functions_of_source_files_are_stored(cache):
+    assert cache.get(json.dumps, render, 'test') == '<b>dumps</b>'
+    assert cache.get(json.dumps, render, 'test') == '<b>dumps</b>'
+    assert (cache.hits, cache.misses, len(cache)) == (1, 1, 1)
+
+
+def test_entries_invalidated_when_the_source_changes(cache, tmp_path, monkeypatch):
+    source = tmp_path / 'disp_cached_module.py'
+    source.write_text('def f():\n    pass\n')
+    monkeypatch.syspath_prepend(str(tmp_path))
+    import disp_cached_module
+    cache.get(disp_cached_module.f, render, 'test')
+    cache.get(disp_cached_module.f, render, 'test')
+    stat = os.stat(source)
+    os.utime(source, (stat.st_atime, stat.st_mtime + 10))
+    cache.get(disp_cached_module.f, render, 'test')
+    assert (cache.hits, cache.misses) == (1, 2)
+    del sys.modules['disp_cached_module']
+
+
+def test_objects_without_source_nor_version_are_not_stored(cache, monkeypatch):
+    module = types.ModuleType('disp_sourceless')
+    exec('def f():\n    pass\n', module.__dict__)
+    module.f.__module__ = module.__name__
+    monkeypatch.setitem(sys.modules, module.__name__, module)
+    cache.get(module.f, render, 'test')
+    cache.get(module.f, render, 'test')
+    assert (cache.hits, len(cache)) == (0, 0)
+
+
+def test_functions_redefined_in_a_notebook(shell, tmp_path, monkeypatch):
+    monkeypatch.setattr(disk_cache, 'filename', str(tmp_path / 'render_cache.sqlite'))
+    monkeypatch.setattr(disk_cache, '_db', None)
+    monkeypatch.setattr(disk_cache, 'enabled', True)
+    shell.run_cell('def disp_f(x):\n    "first doc"')
+    html = py3only.html_formatter_for_builtin_function_or_method(shell.user_ns['disp_f'])
+    assert 'first doc' in html
+    shell.run_cell('def disp_f(x, y):\n    "second doc"')
+    html = py3only.html_formatter_for_builtin_function_or_method(shell.user_ns['disp_f'])
+    assert 'second doc' in html
+    assert 'first doc' not in html
+    assert len(disk_cache) == 0
@@ -0,0 +1,64 @@
+import pickle
+
+from disp import headless
+from disp.__main__ import _chunks, main
+from disp.vendor import repr_getter
+
+
+def test_render_html_is_a_top_level_rendering(shell):
+    html = headless.render_html([len, int, {'a': (1, 2)}])
+    assert html.count('<style>') == 1
+    assert "<p class='jupyter-elided-note'>" not in html
+
+
+def test_render_html_notes_elided_objects(shell):
+    budget = repr_getter.budget
+    max_calls, budget.max_calls = budget.max_calls, 2
+    try:
+        html = headless.render_html([[1], [2], [3], [4]])
+    finally:
+        budget.max_calls = max_calls
+    assert html.count('<style>') == 1
+    assert "<p class='jupyter-elided-note'>" in html
+
+
+def test_render_html_falls_back_to_text(shell):
+    class Plain:
+        def __repr__(self):
+            return '<plain>'
+    assert headless.render_html(Plain()) == '<pre>&lt;plain&gt;</pre>'
+
+
+def test_chunks():
+    assert list(_chunks([0, 5, 9, 12, 20], 2)) == [(0, 9), (9, 20)]
+    assert list(_chunks([0, 5, 9, 12], 2)) == [(0, 9), (9, 12)]
+    assert list(_chunks([0], 2)) == []
+
+
+def test_cli_renders_chunks_in_order(shell, tmp_path):
+    source = tmp_path / 'objects.pkl'
+    objects = [{'index': i, 'items': list(range(i))} for i in range(25)] + [3.5]
+    with open(source, 'wb') as f:
+        for obj in objects:
+            pickle.dump(obj, f)
+    (tmp_path / 'empty.pkl').write_bytes(b'')
+
+    out = tmp_path / 'out'
+    assert main(['render', '-o', str(out), '-j', '2', '-c', '4',
+                 str(source), str(tmp_path / 'empty.pkl')]) == 0
+
+    html = (out / 'objects.html').read_text()
+    assert html.count("<div class='disp-output'>") == len(objects)
+    # Once at the top of the file.
+    assert html.count('<style>') == 1
+    assert html.startswith('<style>')
+    expected = tmp_path / 'expected.html'
+    headless.render_file(str(source), str(expected))
+    assert html == expected.read_text()
+    assert (out / 'empty.html').read_text() == ''
+
+
+def test_render_html_without_stylesheets(shell):
+    html = headless.render_html({'a': [1, 2]}, styled=False)
+    assert '<style>' not in html
+    assert headless.stylesheets_html().count('<style>') == 1
@@ -0,0 +1,40 @@
+import pytest
+
+from disp import lazy
+
+
+@pytest.fixture(autouse=True)
+def lazy_state(monkeypatch):
+    monkeypatch.setattr(lazy, 'enabled', True)
+    monkeypatch.setattr(lazy, 'frontend_ready', False)
+    monkeypatch.setattr(lazy, '_registered', True)
+    monkeypatch.setattr(lazy, '_probe_sent', False)
+
+
+def render():
+    return '<b>content</b>'
+
+
+def test_eager_until_a_frontend_opens_the_comm():
+    first = lazy.lazy_details('summary', render)
+    assert first.startswith(lazy._probe)
+    assert '<b>content</b>' in first
+    second = lazy.lazy_details('summary', render)
+    assert lazy._probe not in second
+    assert '<b>content</b>' in second
+
+
+def test_lazy_once_the_probe_came_back():
+    lazy.lazy_details('summary', render)
+    lazy.LocalComm.probe()
+    html = lazy.lazy_details('summary', render)
+    assert '<b>content</b>' not in html
+    handle = html.split("data-disp-handle='")[1].split("'")[0]
+    assert lazy.LocalComm.expand(handle) == '<b>content</b>'
+
+
+def test_no_probe_outside_of_a_kernel(monkeypatch):
+    monkeypatch.setattr(lazy, '_registered', False)
+    html = lazy.lazy_details('summary', render)
+    assert lazy._probe not in html
+    assert '<b>content</b>' in html
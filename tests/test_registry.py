@@ -0,0 +1,37 @@
+from collections import Counter, OrderedDict
+
+import disp
+from disp.registry import registry
+
+
+class Ordered(OrderedDict):
+    pass
+
+
+def test_subclasses_resolve_to_the_closest_formatter():
+    assert registry.resolve(Ordered) is registry.resolve(dict)
+    assert registry.resolve(Counter) is registry.resolve(dict)
+    assert registry.resolve(object) is None
+
+
+def test_formatter_registered_for_displayed_subclasses(shell):
+    html = shell.display_formatter.formatters['text/html']
+    assert Ordered not in html.type_printers
+    first = html(Ordered(a=1))
+    assert Ordered in html.type_printers
+    assert html(Ordered(a=1)) == first
+    assert html.lookup_by_type(Ordered).__name__ == 'html_formatter_for_mapping'
+
+
+def test_activate_for_subclass(shell):
+    disp.activate_for(Counter('abc'))
+    html = shell.display_formatter.formatters['text/html']
+    assert html.lookup_by_type(Counter).__name__ == 'html_formatter_for_mapping'
+
+
+def test_star_import_exports_the_api():
+    namespace = {}
+    exec('from disp import *', namespace)
+    assert 'activate_for' in namespace
+    assert 'stats' in namespace
+    assert 'sys' not in namespace
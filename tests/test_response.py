@@ -0,0 +1,87 @@
+import json
+
+import pytest
+
+from disp import py3only
+
+
+class Response:
+    """
+    Stand-in for a `requests` response: ``_content`` is ``False`` until the
+    body is downloaded, and reading ``content`` would download it.
+    """
+
+    def __init__(self, content=False, encoding='utf-8', **headers):
+        self.status_code = 200
+        self.encoding = encoding
+        self.headers = headers
+        self._content = content
+
+    @property
+    def content(self):
+        raise AssertionError('the body was downloaded for display')
+
+    def json(self):
+        raise AssertionError('the body was parsed as a whole')
+
+    def __repr__(self):
+        return f'<Response [{self.status_code}]>'
+
+
+@pytest.fixture
+def no_full_parse(monkeypatch):
+    """
+    Fail if a body larger than ``max_json_body`` is decoded by :mod:`json`.
+    """
+    loads = json.loads
+
+    def checked_loads(s, *args, **kwargs):
+        assert len(s) <= py3only.max_json_body
+        return loads(s, *args, **kwargs)
+    monkeypatch.setattr(py3only.json, 'loads', checked_loads)
+
+
+def test_streamed_body_is_not_downloaded(shell):
+    html = py3only.html_formatter_for_Response(Response(**{'Content-Length': '123'}))
+    assert 'Body not downloaded (Content-Length: 123)' in html
+
+
+def test_small_json_is_shown_whole(shell):
+    html = py3only.html_formatter_for_Response(Response(b'{"name": "disp", "tags": ["a", "b"]}'))
+    assert 'Content (JSON)' in html
+    assert 'disp' in html
+
+
+def test_huge_json_lists_top_level_keys(shell, no_full_parse):
+    body = json.dumps({
+        'name': 'disp',
+        'data': [{'k': '}]"', 'v': i} for i in range(200000)],
+        'count': 200000,
+        'ratio': 0.5,
+        'next': None,
+    }).encode()
+    assert len(body) > py3only.max_json_body
+    html = py3only.html_formatter_for_Response(Response(body))
+    assert f'Content (JSON, {len(body)} bytes, top-level keys)' in html
+    assert '<i>str</i>' in html
+    assert '<i>list</i>' in html
+    # The scan stopped in the middle of "data".
+    assert 'count' not in html
+    assert '… more keys' in html
+
+
+def test_json_scan_budget(monkeypatch):
+    body = b'{"a": "x", "b": [1, [2, "]"], {"c": 3}], "c": {"d": null}, "e": -1e3, "f": true}'
+    keys, more = py3only._json_top_level_keys(body, 10, len(body))
+    assert keys == [('a', 'str'), ('b', 'list'), ('c', 'dict'), ('e', 'float'), ('f', 'bool')]
+    assert not more
+    assert py3only._json_top_level_keys(body, 2, len(body)) == ([('a', 'str'), ('b', 'list')], True)
+    assert py3only._json_top_level_keys(body, 10, 20) == ([('a', 'str'), ('b', 'list')], True)
+
+
+def test_huge_non_json_body_is_previewed(shell, no_full_parse):
+    body = b'<html>' + b'x' * (2 * py3only.max_json_body)
+    html = py3only.html_formatter_for_Response(Response(body, encoding='latin-1'))
+    assert f'Content ({len(body)} bytes)' in html
+    assert '&lt;html&gt;' in html
+    assert f'{len(body) - py3only.max_body_preview} bytes' in html
@@ -0,0 +1,399 @@
+import sys
+import threading
+import time
+from types import ModuleType, SimpleNamespace
+
+import pytest
+
+from disp import spark
+
+
+class FakeContext:
+    """
+    Stand-in for a py4j-backed SparkContext, whose attributes take
+    ``delays[name]`` seconds to read.
+    """
+
+    def __init__(self, **delays):
+        self.delays = delays
+        self.calls = {}
+        self._lock = threading.Lock()
+
+    def _get(self, name, value):
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+        time.sleep(self.delays.get(name, 0))
+        return value
+
+    @property
+    def uiWebUrl(self):
+        return self._get('uiWebUrl', 'http://driver:4040')
+
+    @property
+    def version(self):
+        return self._get('version', '3.5.0')
+
+    @property
+    def master(self):
+        return self._get('master', 'local[4]')
+
+    @property
+    def appName(self):
+        return self._get('appName', 'tests')
+
+
+@pytest.fixture(autouse=True)
+def spark_settings():
+    settings = spark.timeout, spark.ttl
+    spark.timeout = 0.2
+    yield
+    spark.timeout, spark.ttl = settings
+    if spark._executor is not None:
+        spark._executor.shutdown(wait=True)
+        spark._executor = None
+
+
+def test_all_fields():
+    html = spark.repr_spark_context_html(FakeContext())
+    assert 'v3.5.0' in html
+    assert 'local[4]' in html
+    assert 'Timed out' not in html
+
+
+def test_timeout_renders_partially():
+    sc = FakeContext(master=1.0)
+    start = time.monotonic()
+    html = spark.repr_spark_context_html(sc)
+    assert time.monotonic() - start < 0.9
+    assert 'v3.5.0' in html
+    assert 'tests' in html
+    assert 'local[4]' not in html
+    assert 'Timed out after 0.2s: master' in html
+
+
+def test_ttl_reuse():
+    sc = FakeContext()
+    spark.repr_spark_context_html(sc)
+    spark.repr_spark_context_html(sc)
+    assert sc.calls['version'] == 1
+    spark.ttl = 0
+    spark.repr_spark_context_html(sc)
+    assert sc.calls['version'] == 2
+
+
+def test_in_flight_fetches_are_reused():
+    sc = FakeContext(master=0.5)
+    assert 'local[4]' not in spark.repr_spark_context_html(sc)
+    assert 'local[4]' not in spark.repr_spark_context_html(sc)
+    assert sc.calls['master'] == 1
+    time.sleep(0.5)
+    assert 'local[4]' in spark.repr_spark_context_html(sc)
+    assert sc.calls['master'] == 1
+
+
+def test_completed_fields_never_time_out(monkeypatch):
+    # wait() returns as soon as the futures complete, possibly before their
+    # done callbacks ran: make those callbacks late.
+    store = spark._Fields.store
+
+    def late_store(self, name, future):
+        if threading.current_thread() is not threading.main_thread():
+            time.sleep(0.05)
+        store(self, name, future)
+
+    monkeypatch.setattr(spark._Fields, 'store', late_store)
+    delays = dict.fromkeys(spark._context_getters, 0.01)
+    for _ in range(5):
+        fields = spark.fetch_fields(FakeContext(**delays), spark._context_getters)
+        assert set(fields) == set(spark._context_getters)
+
+
+def test_session_waits_for_a_single_timeout():
+    context = FakeContext(version=1, master=1)
+    conf = SimpleNamespace(get=lambda key: time.sleep(1) or 'hive')
+    session = SimpleNamespace(conf=conf, sparkContext=context)
+    start = time.perf_counter()
+    html = spark.repr_spark_session_html(session)
+    assert time.perf_counter() - start < 0.35
+    assert 'Timed out after 0.2s: catalogImplementation' in html
+    assert 'Timed out after 0.2s: version, master' in html
+
+
+class FakeStatusTracker:
+    """
+    Stand-in for a StatusTracker, whose active jobs are set by the test as
+    ``{job_id: {stage_id: (completed tasks, total tasks)}}``.
+    """
+
+    def __init__(self):
+        self.jobs = {}
+        self.polls = 0
+
+    def getActiveJobsIds(self):
+        self.polls += 1
+        return list(self.jobs)
+
+    def getJobInfo(self, job_id):
+        return SimpleNamespace(jobId=job_id, status='RUNNING', stageIds=list(self.jobs[job_id]))
+
+    def getStageInfo(self, stage_id):
+        for stages in self.jobs.values():
+            if stage_id in stages:
+                completed, total = stages[stage_id]
+                return SimpleNamespace(stageId=stage_id, name='collect', numTasks=total, numActiveTasks=1,
+                                       numCompletedTasks=completed, numFailedTasks=0)
+
+    def getExecutorInfos(self):
+        return [object(), object()]
+
+
+class FakeSparkContext:
+
+    def __init__(self):
+        self.tracker = FakeStatusTracker()
+
+    def statusTracker(self):
+        return self.tracker
+
+
+class FakeHandle:
+
+    def __init__(self, html):
+        self.updates = [html.data]
+
+    def update(self, html):
+        self.updates.append(html.data)
+
+
+@pytest.fixture
+def panels(monkeypatch):
+    import IPython.display
+    monkeypatch.setattr(IPython.display, 'display', lambda obj, display_id=None: FakeHandle(obj))
+    monkeypatch.setattr(spark.ProgressPanel, 'min_interval', 0.01)
+    monkeypatch.setattr(spark.ProgressPanel, 'max_interval', 0.08)
+    contexts = []
+    yield contexts
+    for sc in contexts:
+        spark.stop_progress(sc)
+
+
+def pollers():
+    return [t for t in threading.enumerate() if t.name == 'disp-spark-progress']
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.01)
+
+
+def test_progress_only_updates_on_change(panels):
+    sc = FakeSparkContext()
+    panels.append(sc)
+    handle = spark.show_progress(sc)
+    assert 'No active jobs' in handle.updates[0]
+    time.sleep(0.2)
+    assert len(handle.updates) == 1
+    sc.tracker.jobs = {1: {3: (5, 10)}}
+    wait_for(lambda: len(handle.updates) == 2)
+    assert '5/10' in handle.updates[1]
+    time.sleep(0.2)
+    assert len(handle.updates) == 2
+
+
+def test_progress_backs_off_while_idle(panels):
+    sc = FakeSparkContext()
+    panels.append(sc)
+    spark.show_progress(sc)
+    time.sleep(0.5)
+    # Polling every min_interval would be ~50 polls; with backoff up to
+    # max_interval it is about 0.5 / 0.08 + 4.
+    assert sc.tracker.polls < 15
+
+
+def test_single_poller_per_context(panels):
+    sc = FakeSparkContext()
+    panels.append(sc)
+    first = spark.show_progress(sc)
+    second = spark.show_progress(sc)
+    assert len(pollers()) == 1
+    sc.tracker.jobs = {1: {3: (1, 4)}}
+    wait_for(lambda: len(first.updates) == 2 and len(second.updates) == 2)
+    assert first.updates == second.updates
+
+
+class FailingHandle(FakeHandle):
+
+    def update(self, html):
+        raise RuntimeError('display closed')
+
+
+def test_only_the_last_displays_are_updated(panels, monkeypatch):
+    monkeypatch.setattr(spark.ProgressPanel, 'max_displays', 2)
+    sc = FakeSparkContext()
+    panels.append(sc)
+    handles = [spark.show_progress(sc) for _ in range(3)]
+    sc.tracker.jobs = {1: {3: (1, 4)}}
+    wait_for(lambda: len(handles[1].updates) == 2 and len(handles[2].updates) == 2)
+    assert len(handles[0].updates) == 1
+
+
+def test_failing_displays_are_dropped(panels, monkeypatch):
+    import IPython.display
+    sc = FakeSparkContext()
+    panels.append(sc)
+    monkeypatch.setattr(IPython.display, 'display', lambda obj, display_id=None: FailingHandle(obj))
+    spark.show_progress(sc)
+    monkeypatch.setattr(IPython.display, 'display', lambda obj, display_id=None: FakeHandle(obj))
+    working = spark.show_progress(sc)
+    sc.tracker.jobs = {1: {3: (1, 4)}}
+    wait_for(lambda: len(working.updates) == 2)
+    assert list(spark._panels[sc]._handles) == [working]
+
+
+def test_stop_progress(panels):
+    sc = FakeSparkContext()
+    handle = spark.show_progress(sc)
+    spark.stop_progress(sc)
+    wait_for(lambda: not pollers())
+    sc.tracker.jobs = {1: {3: (1, 4)}}
+    time.sleep(0.1)
+    assert len(handle.updates) == 1
+    assert sc not in spark._panels
+
+
+class FakeSession:
+
+    def __init__(self):
+        self.conf = SimpleNamespace(get=lambda key, default=None: default)
+        self.sparkContext = SimpleNamespace(setJobGroup=lambda *args, **kwargs: None,
+                                            cancelJobGroup=lambda group: None)
+
+
+def fake_field(name, type_name):
+    return SimpleNamespace(name=name, nullable=False, dataType=SimpleNamespace(simpleString=lambda: type_name))
+
+
+class FakeColumn:
+
+    def __init__(self, name, length=None):
+        self.name = name
+        self.length = length
+
+    def alias(self, name):
+        return self
+
+
+class FakeLimited:
+    """
+    Stand-in for the first ``n`` rows of a :class:`FakeDataFrame`, collecting
+    the columns selected with :class:`FakeColumn`.
+    """
+
+    def __init__(self, parent, n, columns=None):
+        self.parent = parent
+        self.n = n
+        self.columns = columns
+        self.schema = parent.schema
+
+    def select(self, *columns):
+        return FakeLimited(self.parent, self.n, columns)
+
+    def collect(self):
+        self.parent.collects += 1
+        rows = [row if isinstance(row, tuple) else (row,) for row in self.parent.rows[:self.n]]
+        if self.columns is None:
+            return rows
+        return [tuple(value if column.length is None else value[:column.length]
+                      for value, column in zip(row, self.columns)) for row in rows]
+
+
+class FakeDataFrame:
+    """
+    Stand-in for a DataFrame whose query plan hashes to ``plan``, and has the
+    same semantics as the DataFrames with the same ``query``; telling it takes
+    ``delay`` seconds.
+    """
+
+    def __init__(self, rows, plan=1, query=None, session=None, fields=None, delay=0):
+        self.rows = rows
+        self.plan = plan
+        self.query = plan if query is None else query
+        self.delay = delay
+        self.collects = 0
+        self.sparkSession = session or FakeSession()
+        self.schema = SimpleNamespace(fields=fields or [fake_field('id', 'bigint')])
+
+    def semanticHash(self):
+        return self.plan
+
+    def sameSemantics(self, other):
+        time.sleep(self.delay)
+        return self.query == other.query
+
+    def limit(self, n):
+        return FakeLimited(self, n)
+
+
+@pytest.fixture
+def previews(monkeypatch):
+    monkeypatch.setattr(spark, '_previews', spark.OrderedDict())
+
+
+def test_preview_reused_for_the_same_plan(previews):
+    first = FakeDataFrame([1, 2])
+    second = FakeDataFrame([1, 2])
+    assert '<td>2</td>' in spark.repr_spark_dataframe_html(first)
+    assert '<td>2</td>' in spark.repr_spark_dataframe_html(second)
+    assert (first.collects, second.collects) == (1, 0)
+
+
+def test_preview_not_reused_on_hash_collision(previews):
+    spark.repr_spark_dataframe_html(FakeDataFrame([1, 2], query='a'))
+    other = FakeDataFrame([3, 4], query='b')
+    html = spark.repr_spark_dataframe_html(other)
+    assert '<td>3</td>' in html
+    assert '<td>1</td>' not in html
+    assert other.collects == 1
+
+
+def test_preview_expires_after_ttl(previews):
+    spark.ttl = 0.05
+    df = FakeDataFrame([1, 2])
+    spark.repr_spark_dataframe_html(df)
+    spark.repr_spark_dataframe_html(df)
+    assert df.collects == 1
+    time.sleep(0.1)
+    spark.repr_spark_dataframe_html(df)
+    assert df.collects == 2
+
+
+def test_same_semantics_times_out(previews):
+    spark.repr_spark_dataframe_html(FakeDataFrame([1, 2]))
+    slow = FakeDataFrame([1, 2], delay=1)
+    start = time.perf_counter()
+    assert '<td>2</td>' in spark.repr_spark_dataframe_html(slow)
+    assert time.perf_counter() - start < 0.8
+    # Not confirmed in time, so collected again.
+    assert slow.collects == 1
+
+
+@pytest.fixture
+def pyspark_functions(monkeypatch):
+    functions = ModuleType('pyspark.sql.functions')
+    functions.col = lambda name: FakeColumn(name.strip('`'))
+    functions.substring = lambda column, pos, length: FakeColumn(column.name, length)
+    sql = ModuleType('pyspark.sql')
+    sql.functions = functions
+    monkeypatch.setitem(sys.modules, 'pyspark', ModuleType('pyspark'))
+    monkeypatch.setitem(sys.modules, 'pyspark.sql', sql)
+    monkeypatch.setitem(sys.modules, 'pyspark.sql.functions', functions)
+
+
+def test_string_columns_truncated_before_collect(previews, pyspark_functions, monkeypatch):
+    monkeypatch.setattr(spark, 'preview_bytes', 10)
+    df = FakeDataFrame([(1, 'x' * 1000)], fields=[fake_field('id', 'bigint'), fake_field('blob', 'string')])
+    preview = spark.fetch_preview(df, None)
+    assert preview.rows == [(1, 'x' * 11)]
+    assert '<td>xxxxxxxxxx…</td>' in spark.repr_spark_dataframe_html(df)
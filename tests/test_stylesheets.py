@@ -0,0 +1,42 @@
+import pytest
+
+from disp import headless, py3only
+
+
+def html(shell, obj):
+    return shell.display_formatter.format(obj)[0]['text/html']
+
+
+@pytest.fixture
+def session_scope():
+    stylesheets = py3only.stylesheets
+    stylesheets.scope = 'session'
+    stylesheets.reset()
+    yield stylesheets
+    stylesheets.scope = 'display'
+    stylesheets.reset()
+
+
+def test_nested_formatters_do_not_emit_stylesheets(shell):
+    class Klass:
+        pass
+
+    out = html(shell, [len, Klass, str.join, {'type': int, 'functions': [print, repr]}])
+    assert out.count('<style>') == 1
+    assert out.startswith('<style>')
+
+
+def test_every_display_carries_the_stylesheets(shell):
+    assert html(shell, [1, 2]).count('<style>') == 1
+    assert html(shell, [1, 2]).count('<style>') == 1
+
+
+def test_session_scope_emits_once(shell, session_scope):
+    assert html(shell, [len, int]).count('<style>') == 1
+    assert html(shell, [len, int]).count('<style>') == 0
+    session_scope.reset()
+    assert html(shell, [len, int]).count('<style>') == 1
+
+
+def test_headless_emits_once(shell):
+    assert headless.render_html([len, int, [1, (2, 3)]]).count('<style>') == 1
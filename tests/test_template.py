@@ -0,0 +1,28 @@
+import re
+
+import pytest
+
+from disp import py3only, template
+from disp.vendor import repr_getter
+
+
+@pytest.fixture
+def pretty():
+    yield
+    template.compact = True
+
+
+def render(obj):
+    # Nested in a rendering, so without the stylesheets.
+    with repr_getter.render():
+        return py3only.html_formatter_for_mapping(obj)
+
+
+def test_compact_output_is_the_pretty_one_without_indentation(shell, pretty):
+    obj = {'a': [1, (2, 3), {'b': {4, 5}}], 'c': {'d': [len, int]}}
+    template.compact = False
+    pretty_html = render(obj)
+    template.compact = True
+    compact_html = render(obj)
+    assert len(compact_html) < 0.8 * len(pretty_html)
+    assert re.sub(r'>\s+<', '><', pretty_html) == re.sub(r'>\s+<', '><', compact_html)
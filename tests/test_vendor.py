@@ -0,0 +1,120 @@
+import gc
+import threading
+import time
+import weakref
+
+import pytest
+
+from disp.vendor import get_repr_mimebundle, repr_getter
+
+
+def html(obj):
+    return get_repr_mimebundle(obj, include=('text/html',)).data['text/html']
+
+
+def shared_structure():
+    leaf = {'name': 'x' * 300, 'values': list(range(20))}
+    nested = [leaf, (leaf, [leaf, {'deeper': leaf}])]
+    loop = [1, 2]
+    loop.append(loop)
+    return {'a': nested, 'b': nested, 'loop': loop, 'leaf': leaf}
+
+
+def test_concurrent_renderings_of_shared_structures(shell):
+    structure = shared_structure()
+    expected = html(structure)
+    assert 'jupyter-backref' in expected
+    assert 'recursion' in expected
+
+    results = []
+    errors = []
+    barrier = threading.Barrier(16)
+
+    def render():
+        try:
+            barrier.wait()
+            for _ in range(20):
+                results.append(html(structure))
+        except Exception as e:  # pragma: no cover
+            errors.append(e)
+
+    threads = [threading.Thread(target=render) for _ in range(16)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert not errors
+    assert len(results) == 16 * 20
+    assert all(result == expected for result in results)
+    # The state of the renderings did not leak into this context.
+    assert repr_getter.depth == 0
+    assert repr_getter.budget.calls == 0
+
+
+class Slow:
+
+    def _repr_html_(self):
+        time.sleep(0.02)
+        return '<b>slow</b>'
+
+
+@pytest.fixture
+def slow_settings():
+    settings = repr_getter.slow_seconds, repr_getter.skip_slow, repr_getter.max_slow_skips
+    repr_getter.slow_seconds = 0.01
+    yield
+    repr_getter.slow_seconds, repr_getter.skip_slow, repr_getter.max_slow_skips = settings
+    repr_getter.slow_types.clear()
+
+
+def test_slow_types_are_not_skipped_by_default(shell, slow_settings):
+    assert '<b>slow</b>' in html([Slow()])
+    assert Slow in repr_getter.slow_types
+    assert '<b>slow</b>' in html([Slow()])
+
+
+def test_slow_types_do_not_keep_classes_alive(shell, slow_settings):
+    cls = type('Temporary', (Slow,), {})
+    html([cls()])
+    assert cls in repr_getter.slow_types
+    ref = weakref.ref(cls)
+    del cls
+    gc.collect()
+    assert ref() is None
+    assert len(repr_getter.slow_types) == 0
+
+
+def test_slow_types_are_skipped_a_limited_number_of_times(shell, slow_settings):
+    repr_getter.skip_slow = True
+    repr_getter.max_slow_skips = 2
+    html([Slow()])
+    assert 'slow to render' in html([Slow()])
+    assert 'slow to render' in html([Slow()])
+    # Given another chance, and recorded again.
+    assert '<b>slow</b>' in html([Slow()])
+    assert 'slow to render' in html([Slow()])
+
+
+
+class Synchronized:
+    """
+    Renders once all the objects sharing ``barrier`` are being rendered.
+    """
+
+    def __init__(self, barrier):
+        self.barrier = barrier
+
+    def _repr_html_(self):
+        self.barrier.wait(timeout=5)
+        return 'x' * 100
+
+
+def test_parallel_renderings_count_against_the_budget(shell, monkeypatch):
+    from disp import py3only
+    monkeypatch.setattr(py3only, 'parallel_workers', 8)
+    barrier = threading.Barrier(8)
+    with repr_getter.render():
+        list(py3only.htmlify_all([Synchronized(barrier) for _ in range(8)]))
+        assert repr_getter.budget.calls == 8
+        assert repr_getter.budget.chars == 8 * 100